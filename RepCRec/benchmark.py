@@ -0,0 +1,497 @@
+"""
+Authors:
+Saksham Bassi
+Aayush Agrawal
+"""
+import argparse
+import asyncio
+import glob
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import List, Optional
+
+from src.transaction_manager import TransactionManager
+from src.cluster import SiteCluster
+from src.durability import FSYNC_POLICIES, Durability
+from src.io_manager import IOManager
+from src.output import CountingSink, set_output
+from src.output.output import Template
+from src.placement import PLACEMENTS, PlacementPolicy, make_placement
+from src.utils import get_config
+from src.workload import WorkloadGenerator
+
+# Transaction an instruction line belongs to, eg. 7 in "R(T7, x2)"
+TRANSACTION_PATTERN = re.compile(r"\(\s*T(\d+)")
+
+
+def parse_args():
+    """ parses command line argument
+
+    Returns:
+        args: parsed command line arguments
+    """
+    parser = argparse.ArgumentParser(description="RepCRec benchmarks")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    parse = subparsers.add_parser("parse", help="Measure input parsing throughput")
+    parse.add_argument("--input", type=str, required=True,
+                       help="Input file, or directory of input files")
+    parse.add_argument("--repeat", type=int, default=5,
+                       help="Number of timed passes over the input")
+
+    generate = subparsers.add_parser("generate", help="Write a synthetic input script")
+    add_workload_args(generate)
+    generate.add_argument("--output", type=str, default="-",
+                          help="File to write the script to, - for stdout")
+
+    run = subparsers.add_parser(
+        "run", help="Measure execution throughput on a synthetic or given script")
+    add_workload_args(run)
+    run.add_argument("--input", type=str,
+                     help="Run this input file instead of a generated script")
+    run.add_argument("--no-memory", action="store_true",
+                     help="Skip the extra traced pass measuring peak memory")
+    run.add_argument("--wal-dir", type=str,
+                     help="Log site state to a fresh directory under this one on "
+                          "every pass, to measure durability costs")
+    run.add_argument("--wal-fsync", choices=FSYNC_POLICIES, default="batch")
+    run.add_argument("--wal-batch-size", type=int, default=64)
+    run.add_argument("--checkpoint-interval", type=int, default=1000)
+    run.add_argument("--site-processes", type=int, default=0,
+                     help="Run the sites in this many worker processes")
+    run.add_argument("--commit-window", type=int, default=0,
+                     help="Ticks a commit may wait to be grouped with later ones")
+
+    clients = subparsers.add_parser(
+        "clients", help="Measure a running server (see server.py) under concurrent "
+                        "closed-loop clients")
+    add_workload_args(clients)
+    clients.add_argument("--input", type=str,
+                         help="Send this input file instead of a generated script")
+    clients.add_argument("--clients", type=int, default=8,
+                         help="Number of concurrent connections")
+    clients.add_argument("--host", type=str, default="127.0.0.1")
+    clients.add_argument("--port", type=int, default=8765)
+    clients.add_argument("--unix", type=str,
+                         help="Connect to this Unix socket instead of TCP")
+    args = parser.parse_args()
+    return args
+
+
+def add_workload_args(parser: argparse.ArgumentParser):
+    """ adds the WorkloadGenerator parameters to a command
+
+    Args:
+        parser (ArgumentParser): command parser
+    """
+    constants = get_config()["CONSTANTS"]
+    parser.add_argument("--sites", type=int, default=int(constants["num_sites"]))
+    parser.add_argument("--variables", type=int,
+                        default=int(constants["num_variables"]))
+    parser.add_argument("--placement", choices=sorted(PLACEMENTS),
+                        default=constants.get("placement", "default"))
+    parser.add_argument("--replication-factor", type=int,
+                        default=int(constants.get("replication_factor", "1")))
+    parser.add_argument("--transactions", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=10,
+                        help="Transactions active at once")
+    parser.add_argument("--operations", type=int, default=5,
+                        help="Reads/writes per transaction")
+    parser.add_argument("--read-ratio", type=float, default=0.5)
+    parser.add_argument("--skew", type=float, default=0.0,
+                        help="Zipf exponent of variable popularity, 0 is uniform")
+    parser.add_argument("--failure-rate", type=float, default=0.0,
+                        help="Chance of a site failure per instruction")
+    parser.add_argument("--downtime", type=int, default=10,
+                        help="Instructions a failed site stays down")
+    parser.add_argument("--readonly-share", type=float, default=0.0,
+                        help="Fraction of read-only transactions")
+    parser.add_argument("--dump-rate", type=float, default=0.0,
+                        help="Chance of a dump per instruction")
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def workload_from_args(args) -> WorkloadGenerator:
+    """ builds the generator described by the command line
+
+    Args:
+        args: parsed command line arguments
+
+    Returns:
+        WorkloadGenerator
+    """
+    return WorkloadGenerator(
+        sites=args.sites,
+        variables=args.variables,
+        transactions=args.transactions,
+        concurrency=args.concurrency,
+        operations=args.operations,
+        read_ratio=args.read_ratio,
+        skew=args.skew,
+        failure_rate=args.failure_rate,
+        downtime=args.downtime,
+        readonly_share=args.readonly_share,
+        dump_rate=args.dump_rate,
+        seed=args.seed,
+    )
+
+
+class OutcomeSink(CountingSink):
+    """
+    Counts events by kind, and keeps the outcome of each transaction: a transaction
+    aborted (eg. for a deadlock) stays aborted even if the script ends it later,
+    which reports a commit too.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.outcomes = dict()  # {transaction id: "commit" or "abort"}
+
+    def emit(self, event: str, template: Template, **fields) -> None:
+        super().emit(event, template, **fields)
+        if event == "abort":
+            self.outcomes[fields["transaction"]] = event
+        elif event == "commit":
+            self.outcomes.setdefault(fields["transaction"], event)
+
+    def count_outcomes(self) -> dict:
+        """
+        Returns:
+            dict: {"commit": transactions committed, "abort": transactions aborted}
+        """
+        counts = {"commit": 0, "abort": 0}
+        for outcome in self.outcomes.values():
+            counts[outcome] += 1
+        return counts
+
+
+def input_files(path: str) -> List[str]:
+    """ lists input files at a path
+
+    Args:
+        path (str): input file or directory of input files
+
+    Returns:
+        filenames (list): sorted input file paths
+    """
+    if os.path.isdir(path):
+        return sorted(glob.glob(path + "/*"))
+    return [path]
+
+
+def bench_parse(filenames: List[str], repeat: int) -> dict:
+    """ times parsing of the given files, keeping the best pass
+
+    Lines are read into memory first so only parsing is measured.
+
+    Args:
+        filenames (list): input file paths
+        repeat (int): number of timed passes
+
+    Returns:
+        results (dict): lines, instructions, best seconds and lines per second
+    """
+    scripts = []
+    for filename in filenames:
+        with open(filename, "r") as f:
+            scripts.append(f.readlines())
+    lines = sum(len(script) for script in scripts)
+
+    io_manager = IOManager()
+    best = float("inf")
+    instructions = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        instructions = 0
+        for script in scripts:
+            for _ in io_manager.input_stream(script):
+                instructions += 1
+        best = min(best, time.perf_counter() - start)
+
+    return {
+        "lines": lines,
+        "instructions": instructions,
+        "seconds": best,
+        "lines_per_second": lines / best if best else float("inf"),
+    }
+
+
+def execute(
+        lines: List[str], placement: PlacementPolicy, durability: Optional[dict] = None,
+        site_processes: int = 0, commit_window: int = 0,
+) -> dict:
+    """ runs a script on a fresh TransactionManager, counting the reported events
+    and transaction outcomes instead of printing them
+
+    Args:
+        lines (list): lines of the script
+        placement (PlacementPolicy): sites and variables to run on
+        durability (dict): Durability arguments besides its directory, to log site
+            state to a new temporary directory under durability["wal_dir"]
+        site_processes (int): if not 0, run the sites in this many worker processes
+        commit_window (int): ticks a commit may wait to be grouped with later ones
+
+    Returns:
+        results (dict): instructions, seconds, event counts, outcome counts and
+        write-ahead log counters of the run
+    """
+    sink = OutcomeSink()
+    previous = set_output(sink)
+    try:
+        if durability is not None:
+            options = dict(durability)
+            os.makedirs(options["wal_dir"], exist_ok=True)
+            directory = tempfile.mkdtemp(dir=options.pop("wal_dir"))
+            durability = Durability(directory, **options)
+        transaction_manager = TransactionManager(
+            total_sites=placement.num_sites,
+            gc_interval=int(get_config()["CONSTANTS"]["gc_interval"]),
+            placement=placement,
+            durability=durability,
+            cluster=SiteCluster(site_processes) if site_processes > 0 else None,
+            commit_window=commit_window,
+        )
+        instructions = 0
+
+        def counted():
+            nonlocal instructions
+            for transaction in IOManager().input_stream(lines):
+                instructions += 1
+                yield transaction
+
+        start = time.perf_counter()
+        transaction_manager.prepare_sites()
+        transaction_manager.transactions = counted()
+        transaction_manager.start_execution()
+        seconds = time.perf_counter() - start
+    finally:
+        set_output(previous)
+    wal = dict()
+    for site in transaction_manager.sites:
+        for name, count in site.stats()["wal"].items():
+            wal[name] = wal.get(name, 0) + count
+    return {
+        "instructions": instructions,
+        "seconds": seconds,
+        "events": sink.counts,
+        "outcomes": sink.count_outcomes(),
+        "wal": wal,
+    }
+
+
+def bench_run(
+        lines: List[str], placement: PlacementPolicy, memory: bool,
+        durability: Optional[dict] = None, site_processes: int = 0,
+        commit_window: int = 0,
+) -> dict:
+    """ measures throughput and outcomes of a script, and optionally its peak
+    traced memory in a second pass
+
+    Args:
+        lines (list): lines of the script
+        placement (PlacementPolicy): sites and variables to run on
+        memory (bool): whether to measure peak memory
+        durability (dict): see execute
+        site_processes (int): see execute
+        commit_window (int): see execute
+
+    Returns:
+        results (dict): throughput, commit/abort/deadlock counts and peak memory
+    """
+    results = execute(lines, placement, durability, site_processes, commit_window)
+    events = results["events"]
+    outcomes = results["outcomes"]
+    results.update({
+        "instructions_per_second": (
+            results["instructions"] / results["seconds"]
+            if results["seconds"] else float("inf")
+        ),
+        "commits": outcomes["commit"],
+        "aborts": outcomes["abort"],
+        "deadlocks": events.get("deadlock", 0),
+        "waits": events.get("wait", 0),
+        "peak_memory": None,
+    })
+    if memory:
+        tracemalloc.start()
+        try:
+            execute(lines, placement, durability, site_processes, commit_window)
+            results["peak_memory"] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return results
+
+
+def split_by_client(lines: List[str], clients: int) -> List[List[str]]:
+    """ deals the lines of a script to clients: all instructions of a transaction go
+    to the same client, in script order, and fail, recover and dump go to the first
+
+    Args:
+        lines (list): lines of the script
+        clients (int): number of clients
+
+    Returns:
+        scripts (list): lines of each client
+    """
+    scripts = [[] for _ in range(clients)]
+    for line in lines:
+        match = TRANSACTION_PATTERN.search(line)
+        client = (int(match.group(1)) - 1) % clients if match else 0
+        scripts[client].append(line.rstrip("\n"))
+    return scripts
+
+
+def acknowledgement(reply: str) -> Optional[str]:
+    """ recognizes the server's acknowledgement of an instruction, in text or JSON
+
+    Args:
+        reply (str): line sent by the server
+
+    Returns:
+        Optional[str]: "done" or "error", None for any other event
+    """
+    if reply.startswith("{"):
+        event = json.loads(reply)["event"]
+        return event if event in ("done", "error") else None
+    if reply.startswith("Done: "):
+        return "done"
+    if reply.startswith("Error: "):
+        return "error"
+    return None
+
+
+async def bench_clients(
+        scripts: List[List[str]], host: str, port: int, unix_path: Optional[str]
+) -> dict:
+    """ sends each script over its own connection, waiting for every instruction to
+    be acknowledged before sending the next
+
+    Args:
+        scripts (list): lines of each client
+        host (str): server address
+        port (int): server TCP port
+        unix_path (str): if given, the server's Unix socket instead of TCP
+
+    Returns:
+        results (dict): instructions, errors, seconds and sorted latencies
+    """
+    latencies = []
+    errors = 0
+
+    async def client(lines: List[str]):
+        nonlocal errors
+        if unix_path is not None:
+            reader, writer = await asyncio.open_unix_connection(unix_path)
+        else:
+            reader, writer = await asyncio.open_connection(host, port)
+        try:
+            for line in lines:
+                sent = time.perf_counter()
+                writer.write((line + "\n").encode())
+                await writer.drain()
+                while True:
+                    reply = await reader.readline()
+                    if not reply:
+                        raise ConnectionError("Server closed the connection")
+                    kind = acknowledgement(reply.decode())
+                    if kind is not None:
+                        break
+                latencies.append(time.perf_counter() - sent)
+                if kind == "error":
+                    errors += 1
+        finally:
+            writer.close()
+            await writer.wait_closed()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(lines) for lines in scripts))
+    return {
+        "instructions": len(latencies),
+        "errors": errors,
+        "seconds": time.perf_counter() - start,
+        "latencies": sorted(latencies),
+    }
+
+
+def main():
+    args = parse_args()
+    if args.command == "generate":
+        lines = workload_from_args(args).generate()
+        if args.output == "-":
+            for line in lines:
+                sys.stdout.write(line + "\n")
+        else:
+            with open(args.output, "w") as f:
+                for line in lines:
+                    f.write(line + "\n")
+    elif args.command == "run":
+        if args.input:
+            with open(args.input, "r") as f:
+                lines = f.readlines()
+        else:
+            lines = list(workload_from_args(args).generate())
+        placement = make_placement(
+            args.placement, args.sites, args.variables, args.replication_factor)
+        durability = None
+        if args.wal_dir:
+            durability = {
+                "wal_dir": args.wal_dir,
+                "fsync": args.wal_fsync,
+                "batch_size": args.wal_batch_size,
+                "checkpoint_interval": args.checkpoint_interval,
+            }
+        results = bench_run(
+            lines, placement, not args.no_memory, durability, args.site_processes,
+            args.commit_window)
+        print(
+            f"Executed {results['instructions']} instructions in "
+            f"{results['seconds']:.4f}s: {results['instructions_per_second']:.0f} "
+            f"instructions/s"
+        )
+        print(
+            f"commits={results['commits']} aborts={results['aborts']} "
+            f"deadlocks={results['deadlocks']} waits={results['waits']}"
+        )
+        if results["wal"]:
+            print(" ".join(f"wal_{name}={count}" for name, count in results["wal"].items()))
+        if results["peak_memory"] is not None:
+            print(f"peak traced memory={results['peak_memory'] / 2 ** 20:.2f} MiB")
+    elif args.command == "clients":
+        if args.input:
+            with open(args.input, "r") as f:
+                lines = f.readlines()
+        else:
+            lines = list(workload_from_args(args).generate())
+        results = asyncio.run(bench_clients(
+            split_by_client(lines, args.clients), args.host, args.port, args.unix))
+        latencies = results["latencies"]
+        print(
+            f"Sent {results['instructions']} instructions from {args.clients} clients "
+            f"in {results['seconds']:.4f}s: "
+            f"{results['instructions'] / results['seconds']:.0f} instructions/s, "
+            f"{results['errors']} errors"
+        )
+        if latencies:
+            percentiles = {
+                percentile: latencies[(len(latencies) - 1) * percentile // 100]
+                for percentile in (50, 95, 99, 100)
+            }
+            print("latency " + " ".join(
+                f"p{percentile}={seconds * 1000:.3f}ms"
+                for percentile, seconds in percentiles.items()
+            ))
+    elif args.command == "parse":
+        results = bench_parse(input_files(args.input), args.repeat)
+        print(
+            f"Parsed {results['instructions']} instructions ({results['lines']} lines) "
+            f"in {results['seconds']:.4f}s: {results['lines_per_second']:.0f} lines/s"
+        )
+
+
+if __name__ == "__main__":
+    main()
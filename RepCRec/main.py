@@ -4,13 +4,26 @@ Saksham Bassi
 Aayush Agrawal
 """
 import argparse
+import contextlib
 import glob
+import io
 import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Tuple
 
 from read_config import read_config
+from src.cluster import SiteCluster
+from src.durability import FSYNC_POLICIES, Durability
+from src.instrumentation import Profiler
+from src.output import JsonSink, OutputSink, TextSink, emit, get_output, set_output
+from src.placement import PLACEMENTS, make_placement
 from src.transaction_manager import TransactionManager
 from src.utils import log
 
+OUTPUT_SINKS = {"text": TextSink, "json": JsonSink, "quiet": OutputSink}
+
 
 def parse_args():
     """ parses command line argument
@@ -21,41 +34,264 @@ def parse_args():
     parser = argparse.ArgumentParser()
     parser.add_argument('--run-all', action="store_true",
                         help='Whether to run on all tests')
-    parser.add_argument("--input", type=str,
-                        help="Provide absolute path of input file")
+    parser.add_argument("--input", type=str, default="-",
+                        help="Provide absolute path of input file, - reads stdin")
+    parser.add_argument("--jobs", type=int, default=1,
+                        help="Number of processes to run inputs with, when --run-all")
+    parser.add_argument("--output", choices=sorted(OUTPUT_SINKS), default="text",
+                        help="Output format: text, json lines, or quiet")
+    parser.add_argument("--profile", action="store_true",
+                        help="Report time and calls per phase at the end of each input")
+    parser.add_argument("--profile-interval", type=int, default=0,
+                        help="With --profile, also report gauges every N ticks")
+    add_config_args(parser)
     args = parser.parse_args()
     return args
 
 
-def run_input(config, filename: str):
+def add_config_args(parser: argparse.ArgumentParser):
+    """ adds the options overriding constants of the configuration file
+
+    Args:
+        parser (ArgumentParser): command parser
+    """
+    parser.add_argument("--sites", type=int,
+                        help="Number of sites, overrides num_sites of the config")
+    parser.add_argument("--variables", type=int,
+                        help="Number of variables, overrides num_variables of the config")
+    parser.add_argument("--placement", choices=sorted(PLACEMENTS),
+                        help="Placement of variables on sites, overrides the config")
+    parser.add_argument("--replication-factor", type=int,
+                        help="Copies of each variable for hash and range placement")
+    parser.add_argument("--wal-dir", type=str,
+                        help="Log committed site state to this directory and resume "
+                             "from it, overrides wal_dir of the config")
+    parser.add_argument("--wal-fsync", choices=FSYNC_POLICIES,
+                        help="When the logs are forced to disk")
+    parser.add_argument("--wal-batch-size", type=int,
+                        help="Log records written to disk at a time")
+    parser.add_argument("--checkpoint-interval", type=int,
+                        help="Log records of a site between its checkpoints")
+    parser.add_argument("--site-processes", type=int,
+                        help="Worker processes running the sites, 0 for none")
+    parser.add_argument("--commit-window", type=int,
+                        help="Ticks a commit may wait to be grouped with later ones")
+
+
+def config_overrides(args) -> dict:
+    """ collects the constants given on the command line, see add_config_args
+
+    Args:
+        args: parsed command line arguments
+
+    Returns:
+        dict: {constant: value}, None for constants not given
+    """
+    return {
+        "num_sites": args.sites,
+        "num_variables": args.variables,
+        "placement": args.placement,
+        "replication_factor": args.replication_factor,
+        "wal_dir": args.wal_dir,
+        "wal_fsync": args.wal_fsync,
+        "wal_batch_size": args.wal_batch_size,
+        "checkpoint_interval": args.checkpoint_interval,
+        "site_processes": args.site_processes,
+        "commit_window": args.commit_window,
+    }
+
+
+def load_config(configdir: str, overrides: Optional[dict] = None):
+    """ reads the configuration file, replacing constants given on the command line
+
+    Args:
+        configdir (str): file path of configuration file
+        overrides (dict): {constant: value}, None values are ignored
+
+    Returns:
+        config: config variables
+    """
+    config = read_config(configdir)
+    for key, value in (overrides or {}).items():
+        if value is not None:
+            config["CONSTANTS"][key] = str(value)
+    return config
+
+
+def build_transaction_manager(
+        config, name: str, profile_interval: Optional[int] = None
+) -> TransactionManager:
+    """ creates a transaction manager as configured, without its sites
+
+    Args:
+        config: config variables
+        name (str): name of the run, keeping its write-ahead logs apart
+        profile_interval (int): if given, profile the run, reporting gauges every
+            `profile_interval` ticks (0 for only the final summary)
+
+    Returns:
+        TransactionManager
+    """
+    constants = config["CONSTANTS"]
+    durability = None
+    if constants.get("wal_dir"):
+        durability = Durability(
+            os.path.join(constants["wal_dir"], name),
+            fsync=constants.get("wal_fsync", "batch"),
+            batch_size=int(constants.get("wal_batch_size", "64")),
+            checkpoint_interval=int(constants.get("checkpoint_interval", "1000")),
+        )
+    placement = make_placement(
+        constants.get("placement", "default"),
+        num_sites=int(constants["num_sites"]),
+        num_variables=int(constants["num_variables"]),
+        replication_factor=int(constants.get("replication_factor", "1")),
+    )
+    site_processes = int(constants.get("site_processes", "0"))
+    return TransactionManager(
+        total_sites=placement.num_sites,
+        gc_interval=int(constants["gc_interval"]),
+        profiler=None if profile_interval is None else Profiler(profile_interval),
+        placement=placement,
+        durability=durability,
+        cluster=SiteCluster(site_processes) if site_processes > 0 else None,
+        commit_window=int(constants.get("commit_window", "0")),
+    )
+
+
+def run_input(config, filename: str, profile_interval: Optional[int] = None):
     """ processes given file details
 
     Args:
         config: config variables
         filename (str): absolute path of input file
+        profile_interval (int): see build_transaction_manager
+
+    Returns:
+        None
+    """
+    emit("input", "-" * 100 + "\nProcessing for input file={filename}",
+         filename=filename)
+    transaction_manager = build_transaction_manager(
+        config,
+        "stdin" if filename == "-" else os.path.basename(filename),
+        profile_interval,
+    )
+    try:
+        transaction_manager.prepare_input(filename=filename)
+    finally:
+        get_output().flush()
+
+
+def use_output(output: str, filename: str):
+    """ selects the output sink for this process
+
+    Output is buffered, except when instructions are typed in on a terminal.
+
+    Args:
+        output (str): name of the sink in OUTPUT_SINKS
+        filename (str): input file, "-" for stdin
+
+    Returns:
+        None
+    """
+    sink = OUTPUT_SINKS[output]
+    if sink is OutputSink:
+        set_output(OutputSink())
+    elif filename == "-" and sys.stdin.isatty():
+        set_output(sink(buffer_lines=1))
+    else:
+        set_output(sink())
+
+
+def run_input_captured(
+        configdir: str, filename: str, output_format: str,
+        profile_interval: Optional[int] = None, overrides: Optional[dict] = None
+) -> Tuple[str, str, float]:
+    """ processes given file in a worker process, capturing its output
+
+    Args:
+        configdir (str): file path of configuration file
+        filename (str): absolute path of input file
+        output_format (str): name of the sink in OUTPUT_SINKS
+        profile_interval (int): see run_input
+        overrides (dict): see load_config
+
+    Returns:
+        filename (str): the processed input file
+        output (str): everything the run logged
+        seconds (float): wall time of the run
+    """
+    use_output(output_format, filename)
+    output = io.StringIO()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(output):
+        run_input(load_config(configdir, overrides), filename, profile_interval)
+    return filename, output.getvalue(), time.perf_counter() - start
+
+
+def run_all_parallel(
+        configdir: str, filenames: list, jobs: int, output_format: str,
+        profile_interval: Optional[int] = None, overrides: Optional[dict] = None
+):
+    """ processes the given files on a pool of `jobs` processes
+
+    Outputs are emitted in the order of `filenames` regardless of which run finishes
+    first, followed by a per-file wall time summary on stderr.
+
+    Args:
+        configdir (str): file path of configuration file
+        filenames (list): absolute paths of input files
+        jobs (int): number of worker processes
+        output_format (str): name of the sink in OUTPUT_SINKS
+        profile_interval (int): see run_input
+        overrides (dict): see load_config
 
     Returns:
         None
     """
-    log(f"{'-'*100}\nProcessing for input file={filename}")
-    transaction_manager = TransactionManager(
-        total_sites=int(config["CONSTANTS"]["num_sites"])
+    start = time.perf_counter()
+    timings = []
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        for filename, output, seconds in executor.map(
+                run_input_captured, [configdir] * len(filenames), filenames,
+                [output_format] * len(filenames),
+                [profile_interval] * len(filenames),
+                [overrides] * len(filenames)):
+            log(output, end="")
+            timings.append((filename, seconds))
+    get_output().flush()
+
+    summary = [f"{seconds:10.4f}s  {filename}" for filename, seconds in timings]
+    summary.append(
+        f"{sum(seconds for _, seconds in timings):10.4f}s  total over {len(timings)} "
+        f"files, {time.perf_counter() - start:.4f}s wall time with {jobs} jobs"
     )
-    transaction_manager.prepare_input(filename=filename)
+    print("\n".join(summary), file=sys.stderr)
+
 
 def main():
     args = parse_args()
     path = os.path.dirname(os.path.realpath(__file__))
     configdir = "/".join([path, "config.ini"])
-    config = read_config(configdir)
+    overrides = config_overrides(args)
+    config = load_config(configdir, overrides)
+    use_output(args.output, args.input)
+    profile_interval = args.profile_interval if args.profile else None
 
     if args.run_all:
         filepath = args.input + '/*'
-        for filename in sorted(glob.glob(filepath)):
-            run_input(config, filename)
+        filenames = sorted(glob.glob(filepath))
+        if args.jobs > 1:
+            run_all_parallel(
+                configdir, filenames, args.jobs, args.output, profile_interval,
+                overrides)
+        else:
+            for filename in filenames:
+                run_input(config, filename, profile_interval)
     else:
         filename = args.input
-        run_input(config, filename)
+        run_input(config, filename, profile_interval)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,83 @@
+"""
+Authors:
+Saksham Bassi
+Aayush Agrawal
+"""
+import argparse
+import asyncio
+import os
+import signal
+import sys
+
+from main import add_config_args, build_transaction_manager, config_overrides, load_config
+from src.server import TransactionServer
+
+
+def parse_args():
+    """ parses command line argument
+
+    Returns:
+        args: parsed command line arguments
+    """
+    parser = argparse.ArgumentParser(
+        description="Serve the transaction manager to concurrent clients, one "
+                    "instruction per line")
+    parser.add_argument("--host", type=str, default="127.0.0.1",
+                        help="Address to listen on over TCP")
+    parser.add_argument("--port", type=int, default=8765,
+                        help="TCP port to listen on, 0 for any free one")
+    parser.add_argument("--unix", type=str,
+                        help="Listen on this Unix socket path instead of TCP")
+    parser.add_argument("--output", choices=["text", "json"], default="text",
+                        help="Format of the events sent back to clients")
+    parser.add_argument("--queue-size", type=int, default=1024,
+                        help="Instructions queued for the scheduler before clients "
+                             "are made to wait")
+    add_config_args(parser)
+    args = parser.parse_args()
+    return args
+
+
+async def serve(server: TransactionServer, args):
+    """ runs the server until interrupted or terminated, reporting where it listens
+    on stderr
+
+    Args:
+        server (TransactionServer)
+        args: parsed command line arguments
+    """
+    loop = asyncio.get_running_loop()
+    started = loop.create_future()
+    serving = asyncio.ensure_future(
+        server.serve(host=args.host, port=args.port, unix_path=args.unix,
+                     started=started))
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, serving.cancel)
+    await asyncio.wait([started, serving], return_when=asyncio.FIRST_COMPLETED)
+    if started.done():
+        print(f"Listening on {', '.join(map(str, started.result()))}",
+              file=sys.stderr, flush=True)
+    try:
+        await serving
+    except asyncio.CancelledError:
+        pass
+
+
+def main():
+    args = parse_args()
+    path = os.path.dirname(os.path.realpath(__file__))
+    configdir = "/".join([path, "config.ini"])
+    config = load_config(configdir, config_overrides(args))
+    transaction_manager = build_transaction_manager(config, "server")
+    transaction_manager.prepare_sites()
+    server = TransactionServer(
+        transaction_manager, json_lines=args.output == "json",
+        queue_size=args.queue_size)
+    try:
+        asyncio.run(serve(server, args))
+    finally:
+        transaction_manager.finish()
+
+
+if __name__ == "__main__":
+    main()
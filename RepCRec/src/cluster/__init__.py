@@ -0,0 +1 @@
+from src.cluster.cluster import RemoteSite, SiteCluster, SiteWorker
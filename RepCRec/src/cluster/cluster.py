@@ -0,0 +1,405 @@
+"""
+Authors:
+Saksham Bassi
+Aayush Agrawal
+"""
+import multiprocessing
+import os
+import signal
+from typing import Callable, Container, Dict, Iterable, List, Optional, Set, Tuple
+
+from src.cluster.worker import serve
+from src.durability import Durability
+from src.enums import AcquireLockPermission, LockType
+from src.output import emit, get_output
+from src.placement import PlacementPolicy, SiteVariables
+from src.site.site import Site, format_dump
+
+# States of a worker process
+RUNNING = "running"
+SUSPENDED = "suspended"  # stopped with SIGSTOP, its memory intact
+KILLED = "killed"  # terminated, restored from its logs when needed again
+
+
+class SiteWorker:
+    """
+    A worker process running a group of sites, and the batch of calls not sent to it
+    yet. Calls whose result is not needed are only queued: they are sent with the
+    next call that needs a result, or by `flush`, and the worker applies them while
+    the transaction manager goes on.
+    """
+
+    def __init__(
+            self,
+            site_ids: List[int],
+            placement: PlacementPolicy,
+            durability: Optional[Durability] = None,
+    ):
+        self.site_ids = site_ids
+        self.placement = placement
+        self.durability = durability
+        self.pending: List[Tuple[int, str, tuple]] = []  # (site id, method, args)
+        self.connection = None
+        self.process = None
+        self.state = KILLED
+        self.restored = dict()  # {site id: (latest, active, stale, fresh)}
+
+    def start(self) -> None:
+        """ Starts the worker process, without waiting for its sites to be ready """
+        get_output().flush()  # a forked worker would write the buffered output again
+        self.connection, child = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(
+            target=serve,
+            args=(child, self.site_ids, self.placement, self.durability),
+            daemon=True,
+        )
+        self.process.start()
+        child.close()
+        self.state = RUNNING
+
+    def wait_ready(self) -> Dict[int, tuple]:
+        """ Waits for the sites of a started worker to be created and restored
+
+        Returns:
+            dict: {site id: (latest time, active, stale, fresh)}
+        """
+        self.restored = self.connection.recv()
+        return self.restored
+
+    def post(self, site_id: int, method: str, *args) -> None:
+        """ Queues a call whose result is not needed
+
+        Args:
+            site_id (int)
+            method (str): Site method
+            args: its arguments
+        """
+        self.pending.append((site_id, method, args))
+
+    def call(self, site_id: int, method: str, *args):
+        """ Sends the queued calls and this one, and waits for its result
+
+        Args:
+            site_id (int)
+            method (str): Site method
+            args: its arguments
+
+        Returns:
+            result of the call
+        """
+        self.request([(site_id, method, args)])
+        return self.receive()[0]
+
+    def request(self, calls: List[Tuple[int, str, tuple]]) -> None:
+        """ Sends the queued calls and the given ones, whose results are then read
+        with `receive`
+
+        Args:
+            calls (list): (site id, method, args) of each call
+        """
+        self.resume()
+        self.pending.extend(calls)
+        self.connection.send((self.pending, len(calls)))
+        self.pending = []
+
+    def receive(self) -> list:
+        """
+        Returns:
+            list: results of the calls of the last request, in order
+        """
+        results, failure = self.connection.recv()
+        if failure is not None:
+            raise RuntimeError(f"Site worker {self.process.pid} failed: {failure}")
+        return results
+
+    def sync(self) -> None:
+        """ Waits until the worker applied the queued calls """
+        self.call(self.site_ids[0], "is_active")
+
+    def flush(self) -> None:
+        """ Sends the queued calls to a running worker without waiting """
+        if self.pending and self.state == RUNNING:
+            self.connection.send((self.pending, 0))
+            self.pending = []
+
+    def suspend(self) -> None:
+        """ Stops the worker after it applied the queued calls: with durability the
+        process is killed once its logs are flushed, otherwise it is only paused """
+        if self.durability is not None:
+            for site_id in self.site_ids:
+                self.call(site_id, "close")
+            self.process.kill()
+            self.process.join()
+            self.connection.close()
+            self.state = KILLED
+        else:
+            self.sync()
+            os.kill(self.process.pid, signal.SIGSTOP)
+            self.state = SUSPENDED
+
+    def resume(self) -> None:
+        """ Brings a suspended or killed worker back, a killed one being restored from
+        its logs """
+        if self.state == SUSPENDED:
+            os.kill(self.process.pid, signal.SIGCONT)
+            self.state = RUNNING
+        elif self.state == KILLED:
+            self.start()
+            self.wait_ready()
+
+    def stop(self) -> None:
+        """ Applies the queued calls and ends the worker, closing its sites """
+        self.resume()
+        self.flush()
+        self.connection.send(None)
+        self.process.join()
+        self.connection.close()
+
+
+class RemoteSite:
+    """
+    Stand-in for a Site running in a worker process, with the same methods as Site.
+
+    Lock checks, reads, dumps and collections are round trips to the worker; lock
+    acquisitions and releases, commits, failures and recoveries are queued. What the
+    transaction manager asks on every operation (whether the site is up, whether a
+    variable is stale, present or unique) is answered here from a mirror of the
+    site's status, and the locks held are mirrored per transaction so releases are
+    only sent to sites holding locks and waiters are notified here, without asking
+    the worker. Events are reported here too.
+    """
+
+    def __init__(
+            self, id_: int, placement: PlacementPolicy, worker: SiteWorker,
+            listener: Optional[Callable[[Container[int]], None]] = None,
+            dedicated: bool = False,
+    ):
+        self.id = id_
+        self.placement = placement
+        self.variables = SiteVariables(placement, id_)
+        self.worker = worker
+        self.listener = listener  # notified with variables that may unblock waiters
+        self.dedicated = dedicated  # whether the worker runs this site only
+        self.active = True
+        self.stale = False
+        self.fresh: Set[int] = set()
+        self.transaction_locks: Dict[int, Set[int]] = dict()  # {transaction: variables}
+        self.final_stats: Optional[dict] = None  # stats when the worker was stopped
+
+    # Answered from the mirrored status, exactly as by the Site itself
+    is_active = Site.is_active
+    is_stale = Site.is_stale
+    is_variable_present = Site.is_variable_present
+    is_variable_unique = Site.is_variable_unique
+    log_commit = Site.log_commit
+
+    def restore_status(self, active: bool, stale: bool, fresh: Iterable[int]) -> None:
+        """ Mirrors the status the site was restored with in its worker
+
+        Args:
+            active (bool)
+            stale (bool)
+            fresh (Iterable[int])
+        """
+        self.active = active
+        self.stale = stale
+        self.fresh = set(fresh)
+
+    def acquire_lock(self, transaction_id: int, variable: int, locktype: LockType):
+        self.worker.post(self.id, "acquire_lock", transaction_id, variable, locktype)
+        self.transaction_locks.setdefault(transaction_id, set()).add(variable)
+
+    def activate(self):
+        self.worker.resume()
+        self.worker.post(self.id, "activate")
+        self.active = True
+        if self.listener is not None:
+            self.listener(self.variables)
+
+    def can_acquire_read_lock(
+            self, variable: int, transaction_id: int
+    ) -> AcquireLockPermission:
+        return self.worker.call(self.id, "can_acquire_read_lock", variable, transaction_id)
+
+    def can_acquire_write_lock(
+            self, variable: int, transaction_id: int
+    ) -> AcquireLockPermission:
+        return self.worker.call(
+            self.id, "can_acquire_write_lock", variable, transaction_id)
+
+    def collect_garbage(self, watermark: int) -> int:
+        """ Collects versions on a running worker; a stopped one is left as it is """
+        if self.worker.state != RUNNING:
+            return 0
+        return self.worker.call(self.id, "collect_garbage", watermark)
+
+    def commit_writes(self, writes: Iterable[Tuple[int, int, int]]) -> None:
+        writes = list(writes)
+        self.worker.post(self.id, "commit_writes", writes)
+        committed = []
+        for variable, value, timestamp in writes:
+            self.fresh.add(variable)
+            self.log_commit(variable, value, timestamp)
+            committed.append(variable)
+        if committed and self.listener is not None:
+            self.listener(committed)
+
+    def dump(self, timestamp: int) -> None:
+        emit("dump", format_dump, site=self.id,
+             values=self.worker.call(self.id, "dump_values", timestamp))
+
+    def get_value(self, variable: int, timestamp: int) -> int:
+        return self.worker.call(self.id, "get_value", variable, timestamp)
+
+    def get_last_committed_time(self, variable: int, timestamp: int) -> int:
+        return self.worker.call(self.id, "get_last_committed_time", variable, timestamp)
+
+    def get_all_transaction_locks(self, variable: int) -> Set[int]:
+        return self.worker.call(self.id, "get_all_transaction_locks", variable)
+
+    def release_all_locks(self):
+        released = set()
+        for variables in self.transaction_locks.values():
+            released.update(variables)
+        self.transaction_locks = dict()
+        if released:
+            self.worker.post(self.id, "release_all_locks")
+            if self.listener is not None:
+                self.listener(released)
+
+    def release_all_transaction_locks(self, transaction_id: int):
+        released = self.transaction_locks.pop(transaction_id, ())
+        if released:
+            self.worker.post(self.id, "release_all_transaction_locks", transaction_id)
+            if self.listener is not None:
+                self.listener(released)
+
+    def release_transactions_locks(self, transaction_ids: Iterable[int]):
+        transaction_ids = [
+            transaction_id for transaction_id in transaction_ids
+            if transaction_id in self.transaction_locks
+        ]
+        if not transaction_ids:
+            return
+        released = set()
+        for transaction_id in transaction_ids:
+            released.update(self.transaction_locks.pop(transaction_id))
+        self.worker.post(self.id, "release_transactions_locks", transaction_ids)
+        if self.listener is not None:
+            self.listener(released)
+
+    def shutdown(self) -> None:
+        """ Fails the site; a worker running only this site is stopped too, see
+        `SiteWorker.suspend` """
+        self.worker.post(self.id, "shutdown")
+        self.active = False
+        self.stale = True
+        self.fresh = set()
+        if self.dedicated:
+            self.worker.suspend()
+
+    def stats(self) -> dict:
+        if self.final_stats is not None:
+            return self.final_stats
+        return self.worker.call(self.id, "stats")
+
+    def close(self) -> None:
+        if self.final_stats is None:
+            self.worker.call(self.id, "close")
+
+
+class SiteCluster:
+    """
+    Runs the sites in `processes` worker processes, site i in worker
+    (i - 1) mod processes, instead of in the transaction manager's process. Queued
+    site calls are sent at the end of every tick (see `flush`), so commits, lock
+    releases and their logging proceed on all workers in parallel.
+
+    A site failure stops its worker when the worker runs that site alone: it is
+    paused, or killed with durability (its logs having been flushed) and restarted
+    from them, when the site recovers or is next read (eg. by a dump). Sites sharing
+    a worker fail in place.
+    """
+
+    def __init__(self, processes: int):
+        self.processes = processes
+        self.workers: List[SiteWorker] = []
+        self.sites: List[RemoteSite] = []
+
+    def start(
+            self,
+            placement: PlacementPolicy,
+            listener: Optional[Callable[[Container[int]], None]] = None,
+            durability: Optional[Durability] = None,
+    ) -> Tuple[List[RemoteSite], int]:
+        """ Starts the workers and waits until all their sites are ready
+
+        Args:
+            placement (PlacementPolicy): sites and variables to run
+            listener (Callable): notified with variables that may unblock waiters
+            durability (Durability): if given, sites are restored from their logs and
+                log their committed changes
+
+        Returns:
+            sites (list): RemoteSite of each site, by id
+            latest (int): latest version time restored, 0 if nothing was restored
+        """
+        processes = max(1, min(self.processes, placement.num_sites))
+        groups = [[] for _ in range(processes)]
+        for site_id in range(1, placement.num_sites + 1):
+            groups[(site_id - 1) % processes].append(site_id)
+        self.workers = [SiteWorker(group, placement, durability) for group in groups]
+        for worker in self.workers:
+            worker.start()
+
+        sites = []
+        latest = 0
+        for worker in self.workers:
+            restored = worker.wait_ready()
+            for site_id in worker.site_ids:
+                site = RemoteSite(
+                    site_id, placement, worker, listener,
+                    dedicated=len(worker.site_ids) == 1,
+                )
+                site_latest, active, stale, fresh = restored[site_id]
+                site.restore_status(active, stale, fresh)
+                latest = max(latest, site_latest)
+                sites.append(site)
+        sites.sort(key=lambda site: site.id)
+        self.sites = sites
+        return sites, latest
+
+    def gather(self, sites: List[RemoteSite], method: str, *args) -> list:
+        """ Calls a Site method on several sites, requesting from all their workers
+        before waiting for any, so the calls run in parallel
+
+        Args:
+            sites (list): RemoteSites to call
+            method (str): Site method
+            args: its arguments
+
+        Returns:
+            list: result of the call on each site, in order
+        """
+        calls = dict()  # {SiteWorker: [(site id, method, args)]}
+        for site in sites:
+            calls.setdefault(site.worker, []).append((site.id, method, args))
+        for worker, worker_calls in calls.items():
+            worker.request(worker_calls)
+        results = dict()  # {site id: result}
+        for worker, worker_calls in calls.items():
+            for (site_id, _, _), result in zip(worker_calls, worker.receive()):
+                results[site_id] = result
+        return [results[site.id] for site in sites]
+
+    def flush(self) -> None:
+        """ Sends the queued calls of every worker """
+        for worker in self.workers:
+            worker.flush()
+
+    def stop(self) -> None:
+        """ Keeps the final stats of every site and ends the workers """
+        for site in self.sites:
+            site.final_stats = site.stats()
+        for worker in self.workers:
+            worker.stop()
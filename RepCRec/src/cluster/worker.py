@@ -0,0 +1,71 @@
+"""
+Authors:
+Saksham Bassi
+Aayush Agrawal
+"""
+from multiprocessing.connection import Connection
+from typing import List, Optional
+
+from src.durability import Durability
+from src.output import OutputSink, set_output
+from src.placement import PlacementPolicy
+from src.site import Site
+
+
+def serve(
+        connection: Connection,
+        site_ids: List[int],
+        placement: PlacementPolicy,
+        durability: Optional[Durability] = None,
+) -> None:
+    """ Runs a group of sites in a worker process until told to stop
+
+    The sites are created (and restored from their logs, with durability), then
+    their state is sent back as {site id: (latest time, active, stale, fresh)}.
+    Each message is then a batch of (site id, method, args) calls to apply in order
+    and the number of results wanted; the reply, if any results are wanted, holds
+    the results of the last calls of the batch along with the first error raised
+    since the previous reply, if any. None stops the worker.
+
+    Sites report nothing and notify no one here: the RemoteSite proxies do it in
+    the transaction manager's process.
+
+    Args:
+        connection (Connection): worker end of the pipe
+        site_ids (list): ids of the sites to run
+        placement (PlacementPolicy)
+        durability (Durability): if given, the sites log their committed changes
+    """
+    set_output(OutputSink())
+    sites = dict()
+    restored = dict()
+    for site_id in site_ids:
+        site = Site(id_=site_id, placement=placement)
+        site.initialize()
+        latest = durability.attach_site(site) if durability is not None else 0
+        sites[site_id] = site
+        restored[site_id] = (latest, site.active, site.stale, sorted(site.fresh))
+    connection.send(restored)
+
+    failure = None
+    while True:
+        message = connection.recv()
+        if message is None:
+            break
+        calls, replies = message
+        results = []
+        for site_id, method, args in calls:
+            result = None
+            try:
+                result = getattr(sites[site_id], method)(*args)
+            except Exception as error:
+                if failure is None:
+                    failure = f"{method} on site {site_id}: {error!r}"
+            results.append(result)
+        if replies:
+            connection.send((results[-replies:], failure))
+            failure = None
+
+    for site in sites.values():
+        site.close()
+    connection.close()
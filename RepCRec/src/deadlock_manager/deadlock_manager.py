@@ -3,36 +3,45 @@ Authors:
 Saksham Bassi
 Aayush Agrawal
 """
-from src.utils import config
-from typing import List
+from typing import Set
 
 
 class DeadlockManager:
     def __init__(self) -> None:
-        self.nodes = int(config['CONSTANTS']['num_transactions'])
-        self.adjacency_list = [list() for _ in range(self.nodes)]
+        self.adjacency_list = dict()  # {transaction_id: set(transaction_id)}, waits-for edges
+        self.reverse_adjacency_list = dict()  # {transaction_id: set(transaction_id)}
         self.deadlocked_transactions = set()
+        self.dirty_sources = set()  # sources with edges inserted since the last search
 
-    def detect_cycle_in_graph(self, visited: List[bool], stack: List[int], node: int):
-        """ detects cycle in graph
+    def detect_cycle_in_graph(self, visited: Set[int], source: int):
+        """ detects a cycle reachable from `source` with an iterative DFS
 
         Args:
-            visited (list): list of bool visited
-            stack (list): recursion stack
-            node (int): current node being processed
+            visited (set): nodes already fully explored without finding a cycle
+            source (int): node to start the search from
 
         Returns:
             cycle or not (bool)
         """
-        stack.append(node)
+        stack = [source]
+        on_stack = {source}
+        children = [iter(self.adjacency_list.get(source, ()))]
+
+        while children:
+            child = next(children[-1], None)
+            if child is None:
+                node = stack.pop()
+                on_stack.remove(node)
+                visited.add(node)
+                children.pop()
+                continue
 
-        for child in self.adjacency_list[node]:
-            if visited[child]:
+            if child in visited:
                 continue
 
             # Back-edge from node -> child
             # Remove the cycle from stack and put in the deadlocked transactions set
-            if child in stack:
+            if child in on_stack:
                 while len(stack) > 0:
                     transaction_id = stack.pop()
                     self.deadlocked_transactions.add(transaction_id)
@@ -40,38 +49,48 @@ class DeadlockManager:
                         break
                 return True
 
-            if self.detect_cycle_in_graph(visited, stack, child):
-                return True
-
-        visited[node] = True
-        stack.pop()
+            stack.append(child)
+            on_stack.add(child)
+            children.append(iter(self.adjacency_list.get(child, ())))
         return False
 
     def delete_edges_of_source(self, transaction_id: int):
         """ deletes all edges of the source transaction
 
+        Only the neighbours of the transaction are touched, and the transaction is
+        dropped from the graph.
+
         Args:
             transaction_id (int): source transaction id
         """
-        self.adjacency_list[transaction_id] = list()  # remove outgoing transactions from source
-        for node in range(self.nodes):
-            # remove all incoming edges to source transaction
-            if transaction_id in self.adjacency_list[node]:
-                self.adjacency_list[node].remove(transaction_id)
+        # remove outgoing transactions from source
+        for child in self.adjacency_list.pop(transaction_id, ()):
+            self.reverse_adjacency_list[child].discard(transaction_id)
+            if not self.reverse_adjacency_list[child]:
+                del self.reverse_adjacency_list[child]
+        # remove all incoming edges to source transaction
+        for parent in self.reverse_adjacency_list.pop(transaction_id, ()):
+            self.adjacency_list[parent].discard(transaction_id)
+            if not self.adjacency_list[parent]:
+                del self.adjacency_list[parent]
+        self.dirty_sources.discard(transaction_id)
 
     def detect_deadlock_in_graph(self):
         """ detects deadlock in graph
 
+        A cycle can only appear when an edge is inserted, so the search only starts
+        from sources that gained edges since they were last found cycle free.
+
         Returns:
             self.deadlocked_transactions (set)
         """
         self.deadlocked_transactions = set()
-        stack = list()
 
-        visited = [False] * self.nodes
-        for i in range(self.nodes):
-            if self.detect_cycle_in_graph(visited, stack, i):
+        visited = set()
+        for source in sorted(self.dirty_sources):
+            if self.detect_cycle_in_graph(visited, source):
                 return self.deadlocked_transactions
+            self.dirty_sources.discard(source)
         return self.deadlocked_transactions
 
     def insert_transactions_to_source(self, source_transaction_id: int, transactions: set):
@@ -84,5 +103,11 @@ class DeadlockManager:
         if source_transaction_id in transactions:
             transactions.remove(source_transaction_id)  # remove source transaction from set
 
+        if not transactions:
+            return
+        children = self.adjacency_list.setdefault(source_transaction_id, set())
         for transaction_id in transactions:
-            self.adjacency_list[source_transaction_id].append(transaction_id)
+            children.add(transaction_id)
+            self.reverse_adjacency_list.setdefault(transaction_id, set()).add(
+                source_transaction_id)
+        self.dirty_sources.add(source_transaction_id)
@@ -0,0 +1 @@
+from src.durability.durability import FSYNC_POLICIES, Durability, WriteAheadLog
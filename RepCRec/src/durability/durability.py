@@ -0,0 +1,206 @@
+"""
+Authors:
+Saksham Bassi
+Aayush Agrawal
+"""
+import os
+from typing import Callable, Iterator, List, Optional, Tuple
+
+# When the log is forced to disk: after every commit, after every batch written, or
+# never (the operating system decides).
+FSYNC_POLICIES = ("commit", "batch", "never")
+
+# Log records, one per line: "c <variable> <time> <value>" for a committed version,
+# "f" for a failure and "r" for a recovery of the site.
+COMMIT = "c"
+FAIL = "f"
+RECOVER = "r"
+
+
+class WriteAheadLog:
+    """
+    Append-only log of the committed state changes of one site, with compact
+    checkpoints of the whole site state.
+
+    Records are buffered and written `batch_size` at a time (every commit under the
+    "commit" policy). After `checkpoint_interval` records (0 disables) the site
+    writes a checkpoint, a snapshot file (see src.site.snapshot) that replaces the
+    log: restoring opens the checkpoint and replays the records logged since.
+    Replaying is idempotent, so a crash between writing a checkpoint and truncating
+    the log only replays records twice.
+    """
+
+    def __init__(
+            self,
+            path: str,
+            fsync: str = "batch",
+            batch_size: int = 64,
+            checkpoint_interval: int = 1000,
+    ):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(
+                f"Unknown fsync policy {fsync}, expected one of {FSYNC_POLICIES}")
+        self.path = path  # log file; the checkpoint is next to it
+        self.checkpoint_path = path + ".checkpoint"
+        self.fsync = fsync
+        self.batch_size = max(1, batch_size)
+        self.checkpoint_interval = checkpoint_interval
+        self.buffer: List[str] = []
+        self.records_since_checkpoint = 0
+        self.file = None
+        self.stats = {"records": 0, "writes": 0, "fsyncs": 0, "checkpoints": 0}
+
+    def open(self) -> None:
+        """ Opens the log for appending """
+        if self.file is None:
+            self.file = open(self.path, "a")
+
+    def append(self, *fields) -> None:
+        """ Buffers a record, writing out the buffer once it holds a full batch
+
+        Args:
+            fields: record kind followed by its values
+        """
+        self.buffer.append(" ".join(map(str, fields)) + "\n")
+        self.records_since_checkpoint += 1
+        self.stats["records"] += 1
+        if len(self.buffer) >= self.batch_size:
+            self.write(sync=self.fsync != "never")
+
+    def commit(self) -> None:
+        """ Ends the records of one commit, forcing them to disk under the "commit"
+        policy """
+        if self.fsync == "commit":
+            self.write(sync=True)
+
+    def write(self, sync: bool) -> None:
+        """ Writes out the buffered records
+
+        Args:
+            sync (bool): whether to also fsync the log
+        """
+        if self.buffer:
+            self.open()
+            self.file.write("".join(self.buffer))
+            self.buffer = []
+            self.stats["writes"] += 1
+        if sync and self.file is not None:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.stats["fsyncs"] += 1
+
+    def flush(self) -> None:
+        """ Writes out everything buffered, syncing it unless the policy is "never" """
+        self.write(sync=self.fsync != "never")
+        if self.file is not None:
+            self.file.flush()
+
+    def close(self) -> None:
+        """ Flushes and closes the log """
+        self.flush()
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def checkpoint_due(self) -> bool:
+        """
+        Returns:
+            bool: whether enough records were logged since the last checkpoint
+        """
+        return (
+            self.checkpoint_interval > 0
+            and self.records_since_checkpoint >= self.checkpoint_interval
+        )
+
+    def checkpoint(self, export: Callable[[str], None]) -> None:
+        """ Atomically replaces the checkpoint and empties the log
+
+        Args:
+            export (Callable[[str], None]): writes the site state to the given file,
+                see `Site.export_snapshot`
+        """
+        temporary = self.checkpoint_path + ".tmp"
+        export(temporary)
+        if self.fsync != "never":
+            descriptor = os.open(temporary, os.O_RDONLY)
+            try:
+                os.fsync(descriptor)
+            finally:
+                os.close(descriptor)
+        os.replace(temporary, self.checkpoint_path)
+
+        self.buffer = []
+        if self.file is not None:
+            self.file.close()
+        self.file = open(self.path, "w")
+        self.records_since_checkpoint = 0
+        self.stats["checkpoints"] += 1
+
+    def load(self) -> Tuple[Optional[str], Iterator[Tuple[str, ...]]]:
+        """ Finds what was made durable
+
+        Returns:
+            checkpoint (str): path of the last checkpoint, None without one
+            records (Iterator[Tuple[str, ...]]): fields of the records logged since
+        """
+        checkpoint = None
+        if os.path.exists(self.checkpoint_path):
+            checkpoint = self.checkpoint_path
+        return checkpoint, self.records()
+
+    def records(self) -> Iterator[Tuple[str, ...]]:
+        """
+        Yields:
+            fields (Tuple[str, ...]): fields of each complete record in the log; a
+            record torn by a crash is ignored
+        """
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r") as f:
+            for line in f:
+                if line.endswith("\n"):
+                    yield tuple(line.split())
+
+
+class Durability:
+    """
+    Settings of the optional site write-ahead logs, and the factory attaching one to
+    each site. Logs are kept as site-<id>.wal in `directory`; attaching a site to an
+    existing log restores the state it recorded.
+    """
+
+    def __init__(
+            self,
+            directory: str,
+            fsync: str = "batch",
+            batch_size: int = 64,
+            checkpoint_interval: int = 1000,
+    ):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(
+                f"Unknown fsync policy {fsync}, expected one of {FSYNC_POLICIES}")
+        self.directory = directory
+        self.fsync = fsync
+        self.batch_size = batch_size
+        self.checkpoint_interval = checkpoint_interval
+
+    def attach_site(self, site) -> int:
+        """ Restores the site from its log, if any, and logs its changes from now on
+
+        Args:
+            site (Site)
+
+        Returns:
+            int: latest version time restored, 0 if nothing was restored
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        wal = WriteAheadLog(
+            os.path.join(self.directory, f"site-{site.id}.wal"),
+            fsync=self.fsync,
+            batch_size=self.batch_size,
+            checkpoint_interval=self.checkpoint_interval,
+        )
+        latest = site.restore(*wal.load())
+        wal.open()
+        site.wal = wal
+        return latest
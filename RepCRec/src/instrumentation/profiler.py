@@ -0,0 +1,177 @@
+"""
+Authors:
+Saksham Bassi
+Aayush Agrawal
+"""
+from time import perf_counter
+from typing import Callable
+
+from src.output import emit
+
+# TransactionManager phases and Site calls whose time and call count are recorded.
+# Times are inclusive: a handler's time contains the site calls it makes.
+TRANSACTION_MANAGER_PHASES = (
+    "detect_deadlock",
+    "check_wait_queue",
+    "collect_garbage",
+    "commit",
+    "flush_commits",
+    "handle_transaction_fail",
+    "handle_transaction_recover",
+    "handle_transaction_dump",
+    "handle_transaction_begin",
+    "handle_transaction_begin_readonly",
+    "handle_transaction_end",
+    "handle_transaction_none",
+)
+SITE_CALLS = (
+    "acquire_lock",
+    "can_acquire_read_lock",
+    "can_acquire_write_lock",
+    "commit_writes",
+    "dump",
+    "get_last_committed_time",
+    "get_value",
+    "release_all_locks",
+    "release_all_transaction_locks",
+    "release_transactions_locks",
+)
+
+
+def format_snapshot(**fields) -> str:
+    """ Text form of a snapshot, eg. "Profile at time 10: wait_queue=2 ..." """
+    gauges = " ".join(
+        f"{name}={value}" for name, value in fields.items() if name != "time")
+    return f"Profile at time {fields['time']}: {gauges}"
+
+
+def format_summary(phases: list, **gauges) -> str:
+    """ Text form of the end of run summary: one line per phase, then the gauges """
+    lines = [f"{'phase':<45}{'calls':>10}{'total ms':>12}{'avg us':>10}"]
+    for name, calls, seconds in phases:
+        average = seconds / calls * 1e6 if calls else 0.0
+        lines.append(f"{name:<45}{calls:>10}{seconds * 1e3:>12.3f}{average:>10.2f}")
+    lines.append(format_snapshot(**gauges))
+    return "\n".join(lines)
+
+
+class Profiler:
+    """
+    Optional instrumentation of a TransactionManager and its sites. Attaching it
+    shadows the instrumented methods on those instances with timing wrappers, so a
+    run without a profiler executes exactly the same code as before.
+
+    Every `snapshot_interval` ticks (0 disables) the gauges are reported as a
+    "profile_snapshot" event; `report` emits the totals as "profile_summary".
+    """
+
+    def __init__(self, snapshot_interval: int = 0):
+        self.snapshot_interval = snapshot_interval
+        self.calls = dict()  # {phase: count}
+        self.seconds = dict()  # {phase: total seconds}
+        self.transaction_manager = None
+
+    def timed(self, name: str, function: Callable) -> Callable:
+        """ Wraps a function to record its call count and time under `name`
+
+        Args:
+            name (str): phase name
+            function (Callable): bound method to wrap
+
+        Returns:
+            Callable: the wrapper
+        """
+        calls, seconds = self.calls, self.seconds
+        calls.setdefault(name, 0)
+        seconds.setdefault(name, 0.0)
+
+        def wrapper(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                seconds[name] += perf_counter() - start
+                calls[name] += 1
+
+        return wrapper
+
+    def attach(self, transaction_manager) -> None:
+        """ Instruments the phases of a TransactionManager
+
+        Args:
+            transaction_manager (TransactionManager)
+        """
+        self.transaction_manager = transaction_manager
+        for name in TRANSACTION_MANAGER_PHASES:
+            setattr(transaction_manager, name,
+                    self.timed(name, getattr(transaction_manager, name)))
+
+        # check_wait_queue runs exactly once per tick, so it also drives snapshots
+        check_wait_queue = transaction_manager.check_wait_queue
+
+        def tick():
+            executed = check_wait_queue()
+            if (
+                    self.snapshot_interval
+                    and transaction_manager.timestamp % self.snapshot_interval == 0
+            ):
+                emit("profile_snapshot", format_snapshot, **self.snapshot())
+            return executed
+
+        transaction_manager.check_wait_queue = tick
+
+    def attach_site(self, site) -> None:
+        """ Instruments the calls made on a Site, aggregated over all sites
+
+        Args:
+            site (Site)
+        """
+        for name in SITE_CALLS:
+            setattr(site, name, self.timed("site." + name, getattr(site, name)))
+
+    def snapshot(self) -> dict:
+        """
+        Returns:
+            dict: current time, wait queue length, waits-for graph size, lock table
+            size, variables materialized on sites, committed versions per materialized
+            variable and versions reclaimed so far
+        """
+        transaction_manager = self.transaction_manager
+        graph = transaction_manager.DeadlockManager.adjacency_list
+        variables = 0
+        versions = 0
+        max_versions = 0
+        locks = 0
+        for site in transaction_manager.sites:
+            stats = site.stats()
+            variables += stats["materialized_variables"]
+            versions += stats["versions"]
+            max_versions = max(max_versions, stats["max_versions"])
+            locks += stats["locks"]
+        return {
+            "time": transaction_manager.timestamp,
+            "wait_queue": len(transaction_manager.wait_for_lock_queue),
+            "graph_nodes": len(graph),
+            "graph_edges": sum(len(children) for children in graph.values()),
+            "lock_table": locks,
+            "materialized_variables": variables,
+            "versions": versions,
+            "versions_per_variable": round(versions / variables, 3) if variables else 0,
+            "max_versions_per_variable": max_versions,
+            "versions_reclaimed": transaction_manager.gc_stats["versions_reclaimed"],
+        }
+
+    def summary(self) -> list:
+        """
+        Returns:
+            list: (phase, calls, seconds) of every instrumented phase, slowest first
+        """
+        return sorted(
+            ((name, self.calls[name], self.seconds[name]) for name in self.calls),
+            key=lambda phase: phase[2],
+            reverse=True,
+        )
+
+    def report(self) -> None:
+        """ Emits the end of run summary """
+        emit("profile_summary", format_summary, phases=self.summary(), **self.snapshot())
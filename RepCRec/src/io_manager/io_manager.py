@@ -1,138 +1,137 @@
 """
-Authors: 
+Authors:
 Saksham Bassi
 Aayush Agrawal
 """
 import re
-from typing import List
+import sys
+from typing import Iterable, Iterator, Optional, Set
 
 from src.enums import InstructionType, TransactionType
 from src.transaction_manager import Transaction
 
+# One pattern for every instruction of the input grammar, e.g. begin(T1), beginRO(T2),
+# end(T1), fail(3), recover(3), dump(), R(T1, x2) and W(T1, x2, 30). Anything after
+# the closing parenthesis (like a trailing // comment) is ignored. The arguments an
+# instruction must have are checked against INSTRUCTION_ARGUMENTS once matched.
+INSTRUCTION_PATTERN = re.compile(
+    r"\s*(?P<name>beginRO|begin|end|fail|recover|dump|R|W)\(\s*"
+    r"(?:T(?P<transaction>\d+)|(?P<site>\d+))?\s*"
+    r"(?:,\s*x(?P<variable>\d+)\s*(?:,\s*(?P<value>-?\d+)\s*)?)?\)"
+)
+
+INSTRUCTION_TYPES = {
+    "beginRO": InstructionType.BEGINRO,
+    "begin": InstructionType.BEGIN,
+    "end": InstructionType.END,
+    "fail": InstructionType.FAIL,
+    "recover": InstructionType.RECOVER,
+    "dump": InstructionType.DUMP,
+    "R": InstructionType.NO,
+    "W": InstructionType.NO,
+}
+
+# Groups of INSTRUCTION_PATTERN each instruction needs, and no other
+ARGUMENT_GROUPS = ("transaction", "site", "variable", "value")
+INSTRUCTION_ARGUMENTS = {
+    "beginRO": ("transaction",),
+    "begin": ("transaction",),
+    "end": ("transaction",),
+    "fail": ("site",),
+    "recover": ("site",),
+    "dump": (),
+    "R": ("transaction", "variable"),
+    "W": ("transaction", "variable", "value"),
+}
+# {instruction: whether each of ARGUMENT_GROUPS is matched}
+ARGUMENTS_MATCHED = {
+    name: tuple(group in arguments for group in ARGUMENT_GROUPS)
+    for name, arguments in INSTRUCTION_ARGUMENTS.items()
+}
+
 
 class IOManager:
     def __init__(self):
         pass
 
-    @staticmethod
-    def get_site_id(input_: str):
-        """ fetches the site id
+    def input_file(self, filename: str) -> Iterator[Transaction]:
+        """ Reads the input file lazily, yielding each transaction as soon as its line
+        is parsed. A filename of "-" reads from standard input.
 
         Args:
-            input_ (str): input string text
+            filename (str): input filename path, or "-" for stdin
 
-        Returns:
-            site_id (int)
+        Yields:
+            transaction (Transaction): parsed transaction of each instruction line
         """
-        begin, end = input_.find("("), input_.find(")")
-        return int(input_[begin + 1: end])
+        if filename == "-":
+            yield from self.input_stream(sys.stdin)
+            return
+        with open(filename, "r") as f:
+            yield from self.input_stream(f)
 
-    @staticmethod
-    def get_transaction_id(input_: str):
-        """ fetches the transaction id
+    def input_stream(self, lines: Iterable[str]) -> Iterator[Transaction]:
+        """ Parses instruction lines one at a time
 
         Args:
-            input_ (str): input string text
+            lines (Iterable[str]): lines of an input script
 
-        Returns:
-            transaction_id (int)
+        Yields:
+            transaction (Transaction): parsed transaction of each instruction line
         """
-        begin, end = input_.find("("), input_.find(")")
-        return int(input_[begin + 2: end])
+        ro_transactions = set()
+        for line in lines:
+            transaction = self.parse_line(line, ro_transactions)
+            if transaction is not None:
+                yield transaction
 
-    def input_file(self, filename: str) -> List[Transaction]:
-        """ Reads the input file, processes it and creates list of transactions
+    def parse_line(self, line: str, ro_transactions: Set[int]) -> Optional[Transaction]:
+        """ Parses a single line of input in one pass of INSTRUCTION_PATTERN
 
         Args:
-            filename (str): input filename path
+            line (str): line of input script
+            ro_transactions (set): ids of read-only transactions seen so far, updated
+            when a beginRO is parsed
 
         Returns:
-            transactions (list): list of transactions
-        """
-        transactions = []
-        ro_transactions = []
-        with open(filename, "r") as f:
-            for line in f:
-                line = line.strip()
-                if line and line[:2] != "//":  # check if line is not a comment
-                    instruction = None
-                    transaction_type = TransactionType.NONE
-                    transaction_id, site_id, variable, value = 0, 0, 0, 0
-                    if line.find("beginRO") == 0:
-                        instruction = InstructionType.BEGINRO
-                        transaction_id = IOManager.get_transaction_id(line)
-                        ro_transactions.append(transaction_id)
-                    elif line.find("begin") == 0:
-                        instruction = InstructionType.BEGIN
-                        transaction_id = IOManager.get_transaction_id(line)
-                    elif line.find("end") == 0:
-                        instruction = InstructionType.END
-                        transaction_id = IOManager.get_transaction_id(line)
-                    elif line.find("fail") == 0:
-                        instruction = InstructionType.FAIL
-                        site_id = IOManager.get_site_id(line)
-                    elif line.find("dump") == 0:
-                        instruction = InstructionType.DUMP
-                    elif line.find("recover") == 0:
-                        instruction = InstructionType.RECOVER
-                        site_id = IOManager.get_site_id(line)
-                    else:
-                        instruction = InstructionType.NO
-                        if line[0] == "W":
-                            transaction_type = TransactionType.WRITE
-                            transaction_id, variable, value = self.process_write(line)
-                        elif line[0] == "R":
-                            transaction_id, variable = self.process_read(line)
-                            transaction_type = (
-                                TransactionType.READONLY
-                                if transaction_id in ro_transactions
-                                else TransactionType.READ
-                            )
-                        else:
-                            raise Exception("Unknown transaction type")
-
-                    transactions.append(
-                        Transaction(
-                            id_=transaction_id,
-                            transaction_type=transaction_type,
-                            instruction_type=instruction,
-                            site_id=site_id,
-                            variable=variable,
-                            value=value,
-                        )
-                    )
-        return transactions
-
-    def process_read(self, input_: str):
-        """ processes read transaction deets
-
-        Args:
-            input_ (str): line of file
+            transaction (Transaction): parsed transaction, None for blank and comment
+            lines
 
-        Returns:
-            transaction_id (int): read transaction id
-            variable (int): variable data
-        """
-        begin, end = input_.find("("), input_.find(")")
-        raw_details = input_[begin + 2: end].split(",")
-        transaction_id = int(raw_details[0])
-        variable = int(re.findall(r"\d+", raw_details[1])[0])
-        return transaction_id, variable
-
-    def process_write(self, input_: str):
-        """ processes write transaction deets
-
-        Args:
-            input_ (str): line of file
-
-        Returns:
-            transaction_id (int): write transaction id
-            variable (int): variable data
-            value (int):
+        Raises:
+            Exception: if the line is an unknown instruction, or lacks or has extra
+            arguments, eg. R(T1) or fail(T1)
         """
-        begin, end = input_.find("("), input_.find(")")
-        raw_details = input_[begin + 2: end].split(",")
-        transaction_id = int(raw_details[0])
-        variable = int(re.findall(r"\d+", raw_details[1])[0])
-        value = int(raw_details[2])
-        return transaction_id, variable, value
+        match = INSTRUCTION_PATTERN.match(line)
+        if match is None:
+            stripped = line.strip()
+            if not stripped or stripped[:2] == "//":  # check if line is a comment
+                return None
+            raise Exception(f"Unknown instruction: {stripped}")
+
+        name, transaction_id, site_id, variable, value = match.groups()
+        if ARGUMENTS_MATCHED[name] != (
+                transaction_id is not None, site_id is not None,
+                variable is not None, value is not None,
+        ):
+            raise Exception(f"Malformed instruction: {line.strip()}")
+        transaction_id = int(transaction_id) if transaction_id else 0
+        transaction_type = TransactionType.NONE
+        if name == "W":
+            transaction_type = TransactionType.WRITE
+        elif name == "R":
+            transaction_type = (
+                TransactionType.READONLY
+                if transaction_id in ro_transactions
+                else TransactionType.READ
+            )
+        elif name == "beginRO":
+            ro_transactions.add(transaction_id)
+
+        return Transaction(
+            id_=transaction_id,
+            transaction_type=transaction_type,
+            instruction_type=INSTRUCTION_TYPES[name],
+            site_id=int(site_id) if site_id else 0,
+            variable=int(variable) if variable else 0,
+            value=int(value) if value else 0,
+        )
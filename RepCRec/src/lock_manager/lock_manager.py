@@ -3,15 +3,17 @@ Authors:
 Saksham Bassi
 Aayush Agrawal
 """
-from typing import Set
+from typing import Callable, Collection, Iterable, Optional, Set
 
 from src.enums import AcquireLockPermission, LockType
 from src.lock_manager import Lock
 
 
 class LockManager:
-    def __init__(self):
+    def __init__(self, listener: Optional[Callable[[Collection[int]], None]] = None):
+        self.listener = listener  # notified with the variables whose locks are released
         self.table = dict()  # { variable: int, lock: Lock }
+        self.transaction_locks = dict()  # { transaction_id: set(variable) }
 
     def acquire_lock(
             self, transaction_id: int, variable: int, lock_type: LockType
@@ -28,6 +30,7 @@ class LockManager:
         lock = self.table.get(variable, Lock(lock_type, set()))
         lock.transactions.add(transaction_id)
         self.table[variable] = lock
+        self.transaction_locks.setdefault(transaction_id, set()).add(variable)
 
     def can_acquire_write_lock(
             self, variable: int, transaction_id: int
@@ -108,19 +111,56 @@ class LockManager:
         """
         Lock table is cleared/reinitialized when locks are to be released.
         """
+        released = self.table.keys()
         self.table = dict()
+        self.transaction_locks = dict()
+        if self.listener is not None and released:
+            self.listener(released)
 
     def release_transaction_lock(self, transaction_id: int):
         """
-        The lock table is iterated over all the keys (variables) and the requested
-        transaction is removed from the set against it when released.
+        Only the variables the transaction holds locks on are visited; the transaction
+        is removed from the set against each of them and locks left without any
+        transaction are dropped from the table. The listener is told which variables
+        were released.
 
         Args:
             transaction_id (int)
+        """
+        released = self.transaction_locks.pop(transaction_id, ())
+        self.release_variables(transaction_id, released)
+        if self.listener is not None and released:
+            self.listener(released)
 
-        Returns:
-            Set of transaction_ids that have requested a lock on the `variable`
+    def release_transactions_locks(self, transaction_ids: Iterable[int]):
+        """
+        Releases the locks of several transactions as `release_transaction_lock`
+        does, telling the listener once about all the variables released.
+
+        Args:
+            transaction_ids (Iterable[int])
+        """
+        released = set()
+        for transaction_id in transaction_ids:
+            variables = self.transaction_locks.pop(transaction_id, ())
+            self.release_variables(transaction_id, variables)
+            released.update(variables)
+        if self.listener is not None and released:
+            self.listener(released)
+
+    def release_variables(self, transaction_id: int, variables: Iterable[int]):
+        """
+        Removes the transaction from the locks on the given variables, dropping locks
+        left without any transaction: `acquire_lock` keeps the type of a lock already
+        in the table, so an emptied lock left behind would give its old type to the
+        next lock on the variable (eg. a READ lock taken as a WRITE lock).
+
+        Args:
+            transaction_id (int)
+            variables (Iterable[int]): variables the transaction holds locks on
         """
-        for _, lock in self.table.items():
-            if transaction_id in lock.transactions:
-                lock.transactions.remove(transaction_id)
+        for variable in variables:
+            lock = self.table[variable]
+            lock.transactions.discard(transaction_id)
+            if not lock.transactions:
+                del self.table[variable]
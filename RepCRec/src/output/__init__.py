@@ -0,0 +1,3 @@
+from src.output.output import (
+    CountingSink, JsonSink, OutputSink, TextSink, emit, get_output, set_output
+)
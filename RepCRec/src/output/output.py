@@ -0,0 +1,148 @@
+"""
+Authors:
+Saksham Bassi
+Aayush Agrawal
+"""
+import json
+import sys
+from typing import Callable, List, Optional, TextIO, Union
+
+# An event's text form: a str.format template over its fields, or a function of them.
+Template = Union[str, Callable[..., str]]
+
+
+class OutputSink:
+    """
+    Destination of everything the engine reports. The base sink is quiet: events are
+    dropped before their text is ever formatted.
+    """
+
+    enabled = False
+
+    def emit(self, event: str, template: Template, **fields) -> None:
+        """ Reports an event
+
+        Args:
+            event (str): kind of event, eg. "commit" or "lock"
+            template (Template): text form of the event, formatted only if written
+            fields: values describing the event
+        """
+
+    def write(self, text: str) -> None:
+        """ Writes raw text
+
+        Args:
+            text (str): text to write as is
+        """
+
+    def flush(self) -> None:
+        """ Writes out anything buffered """
+
+
+class TextSink(OutputSink):
+    """
+    Writes each event as a line of text, buffering up to `buffer_lines` lines between
+    writes to the stream. Without a stream, the current sys.stdout is used at flush
+    time.
+    """
+
+    enabled = True
+
+    def __init__(self, stream: Optional[TextIO] = None, buffer_lines: int = 1024):
+        self.stream = stream
+        self.buffer_lines = buffer_lines
+        self.buffer: List[str] = []
+
+    def emit(self, event: str, template: Template, **fields) -> None:
+        self.write(self.format(event, template, **fields))
+
+    def format(self, event: str, template: Template, **fields) -> str:
+        """ Formats an event as a line of text
+
+        Args:
+            event (str): kind of event
+            template (Template): text form of the event
+            fields: values describing the event
+
+        Returns:
+            str: the line, with its newline
+        """
+        if callable(template):
+            return template(**fields) + "\n"
+        return template.format(**fields) + "\n"
+
+    def write(self, text: str) -> None:
+        self.buffer.append(text)
+        if len(self.buffer) >= self.buffer_lines:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self.buffer:
+            return
+        stream = self.stream or sys.stdout
+        stream.write("".join(self.buffer))
+        stream.flush()
+        self.buffer = []
+
+
+class JsonSink(TextSink):
+    """
+    Writes each event as a JSON object on its own line, with the event kind under
+    "event" and its fields alongside.
+    """
+
+    def format(self, event: str, template: Template, **fields) -> str:
+        return json.dumps({"event": event, **fields}) + "\n"
+
+
+class CountingSink(OutputSink):
+    """
+    Counts events by kind without formatting or writing anything.
+    """
+
+    enabled = True
+
+    def __init__(self):
+        self.counts = dict()  # {event: count}
+
+    def emit(self, event: str, template: Template, **fields) -> None:
+        self.counts[event] = self.counts.get(event, 0) + 1
+
+
+_output: OutputSink = TextSink()
+
+
+def get_output() -> OutputSink:
+    """
+    Returns:
+        OutputSink: the sink events are currently reported to
+    """
+    return _output
+
+
+def set_output(sink: OutputSink) -> OutputSink:
+    """ Replaces the sink events are reported to, flushing the previous one
+
+    Args:
+        sink (OutputSink)
+
+    Returns:
+        OutputSink: the previous sink
+    """
+    global _output
+    previous = _output
+    previous.flush()
+    _output = sink
+    return previous
+
+
+def emit(event: str, template: Template, **fields) -> None:
+    """ Reports an event to the current sink, skipping all work when it is quiet
+
+    Args:
+        event (str): kind of event
+        template (Template): text form of the event
+        fields: values describing the event
+    """
+    if _output.enabled:
+        _output.emit(event, template, **fields)
@@ -0,0 +1,4 @@
+from src.placement.placement import (
+    PLACEMENTS, DefaultPlacement, HashPlacement, PlacementPolicy, RangePlacement,
+    SiteVariables, make_placement,
+)
@@ -0,0 +1,205 @@
+"""
+Authors:
+Saksham Bassi
+Aayush Agrawal
+"""
+from typing import Container, Iterable, Iterator, List
+
+
+class PlacementPolicy:
+    """
+    Decides which sites hold a replica of each variable. Sites are numbered
+    1..num_sites and variables 1..num_variables. Membership is computed
+    arithmetically, so no per-variable tables are kept.
+    """
+
+    def __init__(self, num_sites: int, num_variables: int):
+        self.num_sites = num_sites
+        self.num_variables = num_variables
+
+    def sites_of(self, variable: int) -> List[int]:
+        """
+        Args:
+            variable (int)
+
+        Returns:
+            List[int]: ids of the sites holding the variable, in ascending order
+        """
+        raise NotImplementedError
+
+    def holds(self, site_id: int, variable: int) -> bool:
+        """
+        Args:
+            site_id (int)
+            variable (int)
+
+        Returns:
+            bool: whether the site holds a replica of the variable
+        """
+        return site_id in self.sites_of(variable)
+
+    def is_replicated(self, variable: int) -> bool:
+        """
+        Args:
+            variable (int)
+
+        Returns:
+            bool: whether the variable has copies on more than one site
+        """
+        return len(self.sites_of(variable)) > 1
+
+    def variables_of(self, site_id: int) -> Iterator[int]:
+        """
+        Args:
+            site_id (int)
+
+        Yields:
+            variable (int): variables held by the site, in ascending order
+        """
+        for variable in range(1, self.num_variables + 1):
+            if self.holds(site_id, variable):
+                yield variable
+
+    def is_valid(self, variable: int) -> bool:
+        return 1 <= variable <= self.num_variables
+
+
+class SiteVariables(Container[int], Iterable[int]):
+    """
+    The variables held by a site, answered from the placement policy without
+    materializing them. It deliberately has no size: counting may need a scan of
+    the whole keyspace.
+    """
+
+    def __init__(self, placement: PlacementPolicy, site_id: int):
+        self.placement = placement
+        self.site_id = site_id
+
+    def __contains__(self, variable) -> bool:
+        return self.placement.holds(self.site_id, variable)
+
+    def __iter__(self) -> Iterator[int]:
+        return self.placement.variables_of(self.site_id)
+
+
+class DefaultPlacement(PlacementPolicy):
+    """
+    Placement from the specification: even variables are on every site and each odd
+    variable i is only on site 1 + (i mod num_sites).
+    """
+
+    def sites_of(self, variable: int) -> List[int]:
+        if not self.is_valid(variable):
+            return []
+        if variable % 2 == 0:
+            return list(range(1, self.num_sites + 1))
+        return [1 + variable % self.num_sites]
+
+    def holds(self, site_id: int, variable: int) -> bool:
+        if not self.is_valid(variable):
+            return False
+        return variable % 2 == 0 or 1 + variable % self.num_sites == site_id
+
+    def is_replicated(self, variable: int) -> bool:
+        return variable % 2 == 0 and self.num_sites > 1
+
+    def variables_of(self, site_id: int) -> Iterator[int]:
+        for variable in range(1, self.num_variables + 1):
+            if variable % 2 == 0 or 1 + variable % self.num_sites == site_id:
+                yield variable
+
+
+class ReplicatedPlacement(PlacementPolicy):
+    """
+    Every variable lives on `replication_factor` consecutive sites (wrapping around)
+    starting at its primary site, which subclasses choose.
+    """
+
+    def __init__(self, num_sites: int, num_variables: int, replication_factor: int):
+        super().__init__(num_sites, num_variables)
+        self.replication_factor = max(1, min(replication_factor, num_sites))
+
+    def primary_of(self, variable: int) -> int:
+        """
+        Returns:
+            int: zero based index of the first site holding the variable
+        """
+        raise NotImplementedError
+
+    def sites_of(self, variable: int) -> List[int]:
+        if not self.is_valid(variable):
+            return []
+        primary = self.primary_of(variable)
+        return sorted(
+            (primary + offset) % self.num_sites + 1
+            for offset in range(self.replication_factor)
+        )
+
+    def holds(self, site_id: int, variable: int) -> bool:
+        if not self.is_valid(variable):
+            return False
+        offset = (site_id - 1 - self.primary_of(variable)) % self.num_sites
+        return offset < self.replication_factor
+
+    def is_replicated(self, variable: int) -> bool:
+        return self.replication_factor > 1
+
+
+class HashPlacement(ReplicatedPlacement):
+    """
+    Primary site chosen by a multiplicative hash of the variable, spreading
+    neighbouring variables over different sites.
+    """
+
+    def primary_of(self, variable: int) -> int:
+        return (variable * 2654435761 % 2 ** 32) % self.num_sites
+
+
+class RangePlacement(ReplicatedPlacement):
+    """
+    Variables split into num_sites contiguous ranges, one per primary site.
+    """
+
+    def primary_of(self, variable: int) -> int:
+        range_size = -(-self.num_variables // self.num_sites)
+        return (variable - 1) // range_size
+
+    def variables_of(self, site_id: int) -> Iterator[int]:
+        range_size = -(-self.num_variables // self.num_sites)
+        primaries = sorted(
+            (site_id - 1 - offset) % self.num_sites
+            for offset in range(self.replication_factor)
+        )
+        for primary in primaries:
+            yield from range(
+                primary * range_size + 1,
+                min((primary + 1) * range_size, self.num_variables) + 1,
+            )
+
+
+PLACEMENTS = {
+    "default": DefaultPlacement,
+    "hash": HashPlacement,
+    "range": RangePlacement,
+}
+
+
+def make_placement(
+        name: str, num_sites: int, num_variables: int, replication_factor: int = 1
+) -> PlacementPolicy:
+    """ Builds a placement policy by name
+
+    Args:
+        name (str): one of PLACEMENTS
+        num_sites (int)
+        num_variables (int)
+        replication_factor (int): copies of each variable, for hash and range
+
+    Returns:
+        PlacementPolicy
+    """
+    if name not in PLACEMENTS:
+        raise ValueError(f"Unknown placement {name}, expected one of {sorted(PLACEMENTS)}")
+    if name == "default":
+        return DefaultPlacement(num_sites, num_variables)
+    return PLACEMENTS[name](num_sites, num_variables, replication_factor)
@@ -0,0 +1 @@
+from src.server.server import Client, RoutingSink, TransactionServer
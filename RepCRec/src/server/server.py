@@ -0,0 +1,271 @@
+"""
+Authors:
+Saksham Bassi
+Aayush Agrawal
+"""
+import asyncio
+import os
+from typing import Dict, Optional, Set, Tuple
+
+from src.enums import InstructionType, TransactionType
+from src.output import JsonSink, OutputSink, TextSink, set_output
+from src.output.output import Template
+from src.transaction_manager import Transaction, TransactionManager
+
+
+class Client:
+    """
+    A connection to the server. Output for the client is queued on its stream
+    writer, which the client's own task drains.
+    """
+
+    def __init__(self, id_: int, writer: asyncio.StreamWriter):
+        self.id = id_
+        self.writer = writer
+        self.closed = False
+        self.transactions: Set[int] = set()  # ids of its transactions still running
+
+    def send(self, text: str) -> None:
+        """ Queues text for the client, dropping it once the client has left
+
+        Args:
+            text (str)
+        """
+        if not self.closed:
+            self.writer.write(text.encode())
+
+    def close(self) -> None:
+        if not self.closed:
+            self.closed = True
+            self.writer.close()
+
+
+class RoutingSink(OutputSink):
+    """
+    Sends each event to the client it concerns: events of a transaction go to the
+    client that began it, even when they happen while another client's instruction
+    runs (eg. a waiting read served, or an abort chosen by deadlock detection); all
+    other events go to the client whose instruction is running.
+    """
+
+    enabled = True
+
+    def __init__(self, formatter: TextSink):
+        self.formatter = formatter  # formats events as text or JSON lines
+        self.issuer: Optional[Client] = None  # client of the running instruction
+        self.owners: Dict[int, Client] = dict()  # {transaction id: Client}
+
+    def emit(self, event: str, template: Template, **fields) -> None:
+        client = self.owners.get(fields.get("transaction"), self.issuer)
+        if client is not None:
+            client.send(self.formatter.format(event, template, **fields))
+
+    def write(self, text: str) -> None:
+        if self.issuer is not None:
+            self.issuer.send(text)
+
+
+class TransactionServer:
+    """
+    Accepts instructions of the input grammar, one per line, from any number of
+    clients over TCP or a Unix socket. Client tasks only read lines and queue them;
+    a single scheduler task executes them one at a time, in arrival order, on the
+    transaction manager, so it is never entered concurrently. Every event is sent
+    to the client it concerns (see RoutingSink), and each instruction is
+    acknowledged to its client with a "done" event once executed, or an "error"
+    event if it could not be, eg. when it names a transaction another client runs.
+    Transactions of a client that disconnects are aborted.
+    """
+
+    def __init__(
+            self,
+            transaction_manager: TransactionManager,
+            json_lines: bool = False,
+            queue_size: int = 1024,
+    ):
+        self.transaction_manager = transaction_manager
+        self.ro_transactions: Set[int] = set()  # read-only transaction ids, any client
+        self.ending: Set[int] = set()  # ids of ended transactions not committed yet
+        self.sink = RoutingSink(JsonSink() if json_lines else TextSink())
+        # (Client, line), None as the line once the client disconnected
+        self.instructions: "asyncio.Queue[Tuple[Client, Optional[str]]]" = (
+            asyncio.Queue(queue_size))
+        self.client_count = 0
+        self.stats = {"clients": 0, "instructions": 0, "errors": 0}
+
+    async def serve(
+            self,
+            host: str = "127.0.0.1",
+            port: int = 0,
+            unix_path: Optional[str] = None,
+            started: Optional[asyncio.Future] = None,
+    ) -> None:
+        """ Serves until cancelled
+
+        Args:
+            host (str): address to listen on over TCP
+            port (int): TCP port, 0 for any free one
+            unix_path (str): if given, listen on this Unix socket instead of TCP
+            started (Future): if given, set to the listening addresses once
+                accepting clients
+        """
+        if unix_path is not None:
+            server = await asyncio.start_unix_server(self.handle_client, unix_path)
+        else:
+            server = await asyncio.start_server(self.handle_client, host, port)
+        previous = set_output(self.sink)
+        scheduler = asyncio.ensure_future(self.schedule())
+        try:
+            async with server:
+                addresses = [socket.getsockname() for socket in server.sockets]
+                if started is not None:
+                    started.set_result(addresses)
+                await server.serve_forever()
+        finally:
+            scheduler.cancel()
+            set_output(previous)
+            if unix_path is not None and os.path.exists(unix_path):
+                os.unlink(unix_path)
+
+    async def handle_client(
+            self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """ Queues the lines a client sends until it disconnects
+
+        Args:
+            reader (StreamReader)
+            writer (StreamWriter)
+        """
+        self.client_count += 1
+        self.stats["clients"] += 1
+        client = Client(self.client_count, writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                await self.instructions.put((client, line.decode()))
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            # a reset connection, or the server shutting down, ends the client too
+            pass
+        finally:
+            await self.instructions.put((client, None))
+
+    async def schedule(self):
+        """ Executes queued instructions one at a time, forever. Whenever none are
+        left, the pending commit group is committed rather than left waiting for
+        more instructions to advance the clock. """
+        while True:
+            client, line = await self.instructions.get()
+            if line is None:
+                self.disconnect(client)
+            else:
+                self.run_line(client, line)
+            if self.instructions.empty() and self.transaction_manager.commit_group:
+                self.transaction_manager.flush_commits()
+                self.forget_ended()
+
+    def run_line(self, client: Client, line: str):
+        """ Parses and executes one line of a client, then acknowledges it, blank and
+        comment lines included
+
+        Args:
+            client (Client): client that sent the line
+            line (str): line of input
+        """
+        self.sink.issuer = client
+        try:
+            transaction = self.transaction_manager.IOManager.parse_line(
+                line, self.ro_transactions)
+            if transaction is not None:
+                self.check_owner(client, transaction)
+                if transaction.instruction_type in (
+                        InstructionType.BEGIN, InstructionType.BEGINRO):
+                    self.sink.owners[transaction.id] = client
+                    client.transactions.add(transaction.id)
+                self.transaction_manager.execute(transaction)
+                if transaction.instruction_type == InstructionType.END:
+                    self.ending.add(transaction.id)
+                self.forget_ended()
+                self.stats["instructions"] += 1
+            self.sink.emit("done", "Done: {instruction}", instruction=line.strip())
+        except Exception as error:
+            self.stats["errors"] += 1
+            self.sink.emit("error", "Error: {instruction}: {message}",
+                           instruction=line.strip(), message=str(error))
+        finally:
+            self.sink.issuer = None
+
+    def check_owner(self, client: Client, transaction: Transaction):
+        """ Checks that a client only acts on its own transactions: transaction ids
+        are shared by all clients, so a begin must not reuse the id of a transaction
+        still running, and reads, writes and ends must name a transaction the client
+        began
+
+        Args:
+            client (Client): client that sent the instruction
+            transaction (Transaction): parsed instruction
+
+        Raises:
+            ValueError: if the instruction is not the client's to issue
+        """
+        instruction_type = transaction.instruction_type
+        if instruction_type in (InstructionType.FAIL, InstructionType.RECOVER,
+                                InstructionType.DUMP):
+            return
+        owner = self.sink.owners.get(transaction.id)
+        if instruction_type in (InstructionType.BEGIN, InstructionType.BEGINRO):
+            if owner is not None:
+                if transaction.id not in self.transaction_manager.readonly_transactions:
+                    # parsing a rejected beginRO marked the running one read-only
+                    self.ro_transactions.discard(transaction.id)
+                raise ValueError(f"Transaction T{transaction.id} is already running")
+        elif owner is not client:
+            raise ValueError(f"Transaction T{transaction.id} was not begun by this "
+                             f"client")
+
+    def disconnect(self, client: Client):
+        """ Aborts the transactions a client left running and closes it
+
+        Args:
+            client (Client)
+        """
+        client.close()
+        for transaction_id in sorted(client.transactions - self.ending):
+            self.sink.issuer = client
+            self.transaction_manager.aborted_transactions.add(transaction_id)
+            try:
+                self.transaction_manager.execute(Transaction(
+                    id_=transaction_id,
+                    transaction_type=TransactionType.NONE,
+                    instruction_type=InstructionType.END,
+                    site_id=0,
+                    variable=0,
+                    value=0,
+                ))
+            finally:
+                self.sink.issuer = None
+                self.forget(transaction_id)
+        self.forget_ended()
+
+    def forget_ended(self):
+        """ Forgets the ended transactions that were committed since the last call,
+        see `TransactionManager.commit_window` """
+        running = self.transaction_manager.transaction_start_timestamp
+        for transaction_id in [
+                transaction_id for transaction_id in self.ending
+                if transaction_id not in running
+        ]:
+            self.ending.discard(transaction_id)
+            self.forget(transaction_id)
+
+    def forget(self, transaction_id: int):
+        """ Drops a finished transaction from its client
+
+        Args:
+            transaction_id (int)
+        """
+        client = self.sink.owners.pop(transaction_id, None)
+        if client is not None:
+            client.transactions.discard(transaction_id)
+        self.ro_transactions.discard(transaction_id)
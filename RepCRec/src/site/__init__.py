@@ -1 +1,3 @@
 from src.site.site import Site
+from src.site.snapshot import SiteSnapshot
+from src.site.version_chain import VersionChain
@@ -3,24 +3,59 @@ Authors:
 Saksham Bassi
 Aayush Agrawal
 """
-import math
-from typing import Dict, Set
+from typing import Callable, Container, Iterable, List, Optional, Set, Tuple
 
 from src.enums import LockType, AcquireLockPermission, LockType
 from src.lock_manager import LockManager
-from src.utils import config, log
+from src.site.snapshot import SiteSnapshot, write_snapshot
+from src.site.version_chain import VersionChain
+from src.output import emit
+from src.durability.durability import COMMIT, FAIL, RECOVER, WriteAheadLog
+from src.placement import PlacementPolicy, SiteVariables
 
-COUNT_VARIABLES = int(config["CONSTANTS"]["num_variables"])
+
+def format_dump(site: int, values: List[Tuple[int, int]]) -> str:
+    """ Text form of a site dump, eg. "x2:20 x4:40 "
+
+    Args:
+        site (int): id of the dumped site
+        values (list): (variable, value) pairs
+
+    Returns:
+        str
+    """
+    return "".join(f"x{variable}:{value} " for variable, value in values)
+
+
+def initial_value(variable: int) -> int:
+    """ Value of a variable before any commit, as per specification
+
+    Args:
+        variable (int)
+
+    Returns:
+        int
+    """
+    return variable * 10
 
 
 class Site:
-    def __init__(self, id_: int):
+    def __init__(
+            self, id_: int, placement: PlacementPolicy,
+            listener: Optional[Callable[[Container[int]], None]] = None
+    ):
         self.id = id_
         self.active = True
-        self.lock_manager = LockManager()
-        self.data = dict()  # {variable: {time: value}}
-        self.stale = dict()
-        self.cache = dict()  # {variable: {time: value}}
+        self.placement = placement  # decides which variables the site holds
+        self.variables = SiteVariables(placement, id_)
+        self.listener = listener  # notified with variables that may unblock waiters
+        self.lock_manager = LockManager(listener)
+        self.data = dict()  # {variable: VersionChain}, for variables accessed so far
+        # memory-mapped versions of the variables not in data, see open_snapshot
+        self.snapshot: Optional[SiteSnapshot] = None
+        self.stale = False  # replicated variables are stale since the last failure
+        self.fresh = set()  # replicated variables committed since the last failure
+        self.wal: Optional[WriteAheadLog] = None  # optional log of committed changes
 
     def acquire_lock(self, transaction_id: int, variable: int, locktype: LockType):
         """
@@ -31,9 +66,14 @@ class Site:
 
     def activate(self):
         """
-        Activate the site.
+        Activate the site. Its variables become readable/writable again, so waiters
+        on them are notified.
         """
         self.active = True
+        if self.wal is not None:
+            self.wal.append(RECOVER)
+        if self.listener is not None:
+            self.listener(self.variables)
 
     def can_acquire_read_lock(
             self, variable: int, transaction_id: int
@@ -56,39 +96,50 @@ class Site:
 
     def initialize(self) -> None:
         """
-        Initializes the site object with data ie { variable: { time, value } }.
-        Even variables are present in all sites as per specification.
+        Initializes the site object with empty data ie { variable: VersionChain }.
+        The variables the placement policy puts on this site (by default, even
+        variables are present in all sites as per specification) are materialized
+        with their initial value on first access, see `versions`.
         """
-        for i in range(1, COUNT_VARIABLES + 1):
-            if i % 2 == 0 or 1 + (i % 10) == self.id:
-                self.stale[i] = False
-                self.data[i] = {0: i * 10}
+        self.data = dict()
 
-    def _floor_of_timestamp(
-            self, data_per_variable: Dict[int, int], timestamp: int
-    ) -> int:
-        """
-        Find the timestamp that is less than the given timestamp and is as close as
-        possible to it. 
+    def versions(self, variable: int) -> VersionChain:
+        """ Committed versions of a variable held by the site, materialized on first
+        access from the open snapshot, or else with the initial value.
+
+        Args:
+            variable (int)
+
+        Returns:
+            VersionChain
+        """
+        data_for_variable = self.data.get(variable)
+        if data_for_variable is None:
+            snapshot_versions = (
+                self.snapshot.versions(variable) if self.snapshot is not None else None)
+            if snapshot_versions is not None:
+                data_for_variable = VersionChain.of(snapshot_versions)
+            else:
+                data_for_variable = VersionChain(0, initial_value(variable))
+            self.data[variable] = data_for_variable
+        return data_for_variable
+
+    def committed_versions(self, variable: int) -> VersionChain:
+        """ Committed versions of a variable for reading: versions still only in the
+        open snapshot are read in place instead of being materialized.
 
         Args:
-            data_per_variable (Dict[int, int]): All the values of variables at different
-            timestamps. 
-            timestamp (int): target
+            variable (int)
 
         Returns:
-            int: floor of target timestamp
-        """
-        closeness = math.inf
-        closest_timestamp = -1
-        for current_timestamp, _ in data_per_variable.items():
-            if (
-                    current_timestamp < timestamp
-                    and timestamp - current_timestamp < closeness
-            ):
-                closeness = timestamp - current_timestamp
-                closest_timestamp = current_timestamp
-        return closest_timestamp
+            VersionChain: must not be modified
+        """
+        data_for_variable = self.data.get(variable)
+        if data_for_variable is None and self.snapshot is not None:
+            data_for_variable = self.snapshot.versions(variable)
+        if data_for_variable is None:
+            data_for_variable = self.versions(variable)
+        return data_for_variable
 
     def get_value(self, variable: int, timestamp: int) -> int:
         """ Get last committed value for the give variable on/before the time
@@ -101,41 +152,129 @@ class Site:
         Returns:
             int
         """
-        data_so_far = self.data[variable]
-        # find a key in `data_so_far` that is less than equal to timestamp
-        closest_timestamp = self._floor_of_timestamp(data_so_far, timestamp)
-        return data_so_far[closest_timestamp]
+        return self.committed_versions(variable).floor_value(timestamp)
+
+    def collect_garbage(self, watermark: int) -> int:
+        """ Prunes committed versions that no read at or after `watermark` can see.
+
+        Args:
+            watermark (int): oldest timestamp any active transaction may read at
+
+        Returns:
+            int: number of versions reclaimed
+        """
+        reclaimed = 0
+        for data_for_variable in self.data.values():
+            reclaimed += data_for_variable.prune(watermark)
+        return reclaimed
 
-    def commit_cache(self, variable: int) -> None:
+    def commit_writes(self, writes: Iterable[Tuple[int, int, int]]) -> None:
         """
-        Variable in the site is committed (as part of a transaction), so the cache for
-        the variable is passed to the "data" attribute and cache is cleaned.
+        A transaction is committed, so in one pass its writes to this site are added
+        to the "data" attribute, and waiters are notified once for all the committed
+        variables.
 
         Args:
-            variable (int): variable value
+            writes (Iterable[Tuple[int, int, int]]): (variable, value, timestamp) of
+                each variable written
+        """
+        committed = []
+        wal = self.wal
+        for variable, value, timestamp in writes:
+            self.versions(variable).add(timestamp, value)
+            self.fresh.add(variable)
+            if wal is not None:
+                wal.append(COMMIT, variable, timestamp, value)
+            self.log_commit(variable, value, timestamp)
+            committed.append(variable)
+        if wal is not None:
+            wal.commit()
+            if wal.checkpoint_due():
+                wal.checkpoint(self.export_snapshot)
+        if committed and self.listener is not None:
+            self.listener(committed)
+
+    def export_snapshot(self, path: str) -> None:
+        """ Writes the site's status and committed versions as a snapshot file, see
+        src.site.snapshot. Variables never accessed are left out; they hold their
+        initial value.
+
+        Args:
+            path (str): file to write
+        """
+        variables = set(self.data)
+        if self.snapshot is not None:
+            variables.update(self.snapshot)
+        write_snapshot(
+            path, self.id, self.active, self.stale, self.fresh,
+            ((variable, self.committed_versions(variable))
+             for variable in sorted(variables)),
+        )
+
+    def open_snapshot(self, path: str) -> int:
+        """ Replaces the site's status and committed versions with those of a snapshot
+        file. The file is memory-mapped: versions are read from it in place and only
+        copied into "data" when a variable is committed again.
+
+        Args:
+            path (str): file written by `export_snapshot`
+
+        Returns:
+            int: latest version time in the snapshot
         """
-        data_for_variable = self.data.get(variable, {})
-        cache_for_variable = self.cache.get(variable, {})
-        for time, value in cache_for_variable.items():
-            data_for_variable[time] = value
-            self.stale[variable] = False
-        self.data[variable] = data_for_variable
-        if variable in self.cache:
-            self.log_commit(variable, self.cache[variable])
-        self.cache[variable] = {}
-
-    def log_commit(self, variable: int, committed_data: Dict[int, int]):
+        if self.snapshot is not None:
+            self.snapshot.close()
+        self.snapshot = SiteSnapshot(path)
+        self.data = dict()
+        self.active = self.snapshot.active
+        self.stale = self.snapshot.stale
+        self.fresh = set(self.snapshot.fresh)
+        return self.snapshot.latest_time
+
+    def restore(self, checkpoint: Optional[str], records: Iterable[Tuple[str, ...]]) -> int:
+        """ Rebuilds the site from a checkpoint and the log records written after it,
+        without reporting or notifying anything.
+
+        Args:
+            checkpoint (str): snapshot file, see `open_snapshot`, None to start from
+                the initial values
+            records (Iterable[Tuple[str, ...]]): log records, see src.durability
+
+        Returns:
+            int: latest version time restored, 0 if nothing was restored
+        """
+        latest = 0
+        if checkpoint is not None:
+            latest = self.open_snapshot(checkpoint)
+        for record in records:
+            if record[0] == COMMIT:
+                variable, timestamp, value = map(int, record[1:])
+                self.versions(variable).add(timestamp, value)
+                self.fresh.add(variable)
+                latest = max(latest, timestamp)
+            elif record[0] == FAIL:
+                self.active = False
+                self.stale = True
+                self.fresh = set()
+            elif record[0] == RECOVER:
+                self.active = True
+        return latest
+
+    def log_commit(self, variable: int, value: int, timestamp: int):
         """ logs commit message on output screen
 
         Args:
             variable (int): variable value
-            committed_data (dict): commit details
+            value (int): committed value
+            timestamp (int): time of the write
 
         Returns:
             None
         """
-        for timestamp, value in committed_data.items():
-            log(f"Committed variable {variable}; with value {value}; on site {self.id}; at time {timestamp}")
+        emit("commit_variable",
+             "Committed variable {variable}; with value {value}; on site {site}; "
+             "at time {time}",
+             variable=variable, value=value, site=self.id, time=timestamp)
 
     def get_last_committed_time(self, variable: int, timestamp: int) -> int:
         """ fetches kast commited timestamp
@@ -147,8 +286,7 @@ class Site:
         Returns:
             int: Last committed time for variable before the time `timestamp`
         """
-        data_so_far = self.data[variable]
-        return self._floor_of_timestamp(data_so_far, timestamp)
+        return self.committed_versions(variable).floor_time(timestamp)
 
     def get_all_transaction_locks(self, variable: int) -> Set[int]:
         """
@@ -159,18 +297,63 @@ class Site:
 
     def dump(self, timestamp: int) -> None:
         """
-        Access the values of all variables in the site at/floor timestamp.
+        Reports the values of all variables in the site at/floor timestamp.
 
         Args:
             timestamp (int)
         """
-        for variable, data_so_far in self.data.items():
-            if timestamp in data_so_far:
-                value = data_so_far[timestamp]
-            else:
-                value = data_so_far[self._floor_of_timestamp(data_so_far, timestamp)]
-            log(f"x{variable}:{value}", end=" ")
-        log("")
+        emit("dump", format_dump, site=self.id, values=self.dump_values(timestamp))
+
+    def dump_values(self, timestamp: int) -> List[Tuple[int, int]]:
+        """
+        Access the values of all variables in the site at/floor timestamp. Variables
+        never accessed still hold their initial value and are not materialized.
+
+        Args:
+            timestamp (int)
+
+        Returns:
+            list: (variable, value) pairs in placement order
+        """
+        data = self.data
+        snapshot = self.snapshot
+        values = []
+        for variable in self.variables:
+            data_for_variable = data.get(variable)
+            if data_for_variable is None and snapshot is not None:
+                data_for_variable = snapshot.versions(variable)
+            values.append((
+                variable,
+                data_for_variable.floor_value(timestamp, inclusive=True)
+                if data_for_variable is not None else initial_value(variable),
+            ))
+        return values
+
+    def stats(self) -> dict:
+        """
+        Returns:
+            dict: variables materialized, their committed versions, the most versions
+            of a single variable, variables locked, and the write-ahead log counters
+        """
+        versions = [len(chain) for chain in self.data.values()]
+        return {
+            "materialized_variables": len(versions),
+            "versions": sum(versions),
+            "max_versions": max(versions, default=0),
+            "locks": len(self.lock_manager.table),
+            "wal": dict(self.wal.stats) if self.wal is not None else dict(),
+        }
+
+    def close(self) -> None:
+        """
+        Flushes and closes the site's write-ahead log, if any, and releases the
+        mapping of its open snapshot, if any.
+        """
+        if self.wal is not None:
+            self.wal.close()
+        if self.snapshot is not None:
+            self.snapshot.close()
+            self.snapshot = None
 
     def is_active(self) -> bool:
         """
@@ -196,57 +379,60 @@ class Site:
         """
         self.lock_manager.release_transaction_lock(transaction_id)
 
+    def release_transactions_locks(self, transaction_ids: Iterable[int]):
+        """
+        Ask the lock manager of the site to release the locks of several transactions
+        at once, notifying waiters once
+
+        Args:
+            transaction_ids (Iterable[int]): ids of the transactions
+        """
+        self.lock_manager.release_transactions_locks(transaction_ids)
+
     def shutdown(self) -> None:
         """
         When a site is shutdown, its active attribute is set to False
 
-        As per the specification, even variables are present at all the sites.
-        So the variable in site should be marked stale to differentiate from
-        even variables at other sites that are active.
+        Replicated variables (by default even variables, present at all the sites)
+        should be marked stale to differentiate from their copies at other sites
+        that are active. Rather than visiting every variable, the site as a whole is
+        marked stale and variables become fresh again as they are committed.
         """
         self.active = False
-        for i in range(1, COUNT_VARIABLES + 1):
-            if i % 2 == 0:
-                self.stale[i] = True
-        self.cache = dict()
+        self.stale = True
+        self.fresh = set()
+        if self.wal is not None:
+            self.wal.append(FAIL)
 
     def is_stale(self, variable: int) -> bool:
-        """ When a site has failed/shutdown, even variables in it are marked stale. This is
-        because they can go out of sync with the copies of even variables on other
-        (active) sites.
+        """ When a site has failed/shutdown, replicated variables in it are stale until
+        they are next committed. This is because they can go out of sync with their
+        copies on other (active) sites.
 
-        This function returns if a variable in the site is marked stale.
+        This function returns if a variable in the site is stale.
 
         Args:
             variable (int)
 
         Returns: bool
         """
-        return self.stale.get(variable)
-
-    def set_cache(self, variable: int, value: int, timestamp: int):
-        """ In the current site, for the given variable, store the value against the
-        timestamp. When the variable in the site is committed (as part of a transaction),
-        the cache is passed to the "data" attribute and cache should be cleaned.
-
-        Returns:
-
-        """
-        cache_so_far = self.cache.get(variable, dict())
-        cache_so_far[timestamp] = value
-        self.cache[variable] = cache_so_far
+        return (
+            self.stale
+            and variable not in self.fresh
+            and self.placement.is_replicated(variable)
+        )
 
     def is_variable_unique(self, variable: int) -> bool:
-        """ Even variables are present on all sites and odd variables are present on only
-        one site as per specification. So only odd variables can be unique.
+        """ A variable is unique if the placement policy keeps it on this site only (by
+        default odd variables, as per specification).
 
         Args:
             variable (int)
 
         Returns:
-            bool: whether variable is unique(odd) or not
+            bool: whether variable is unique or not
         """
-        return variable in self.data and variable % 2 != 0
+        return variable in self.variables and not self.placement.is_replicated(variable)
 
     def is_variable_present(self, variable: int) -> bool:
         """ checks if variable is present or not
@@ -257,4 +443,4 @@ class Site:
         Returns:
             bool: whether variable is present in current sites's data
         """
-        return variable in self.data
+        return variable in self.variables
@@ -0,0 +1,142 @@
+"""
+Authors:
+Saksham Bassi
+Aayush Agrawal
+"""
+import mmap
+import struct
+from array import array
+from bisect import bisect_left
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from src.site.version_chain import VersionChain
+
+# Layout of a snapshot file, all integers 64-bit in native byte order:
+#   header: magic, site id, flags, #variables, #versions, #fresh, latest version time
+#   variables[#variables]      ids in ascending order
+#   offsets[#variables + 1]    versions of variables[i] are at offsets[i]:offsets[i+1]
+#   times[#versions]           version timestamps, ascending per variable
+#   values[#versions]          version values
+#   fresh[#fresh]              replicated variables committed since the last failure
+MAGIC = b"RCRSNAP1"
+HEADER = struct.Struct("=8sqqqqqq")
+ACTIVE = 1
+STALE = 2
+
+
+def write_snapshot(
+        path: str,
+        site_id: int,
+        active: bool,
+        stale: bool,
+        fresh: Iterable[int],
+        chains: Iterable[Tuple[int, VersionChain]],
+) -> None:
+    """ Writes a site's multiversion data as a snapshot file
+
+    Args:
+        path (str): file to write
+        site_id (int)
+        active (bool): whether the site is up
+        stale (bool): whether the site failed since it was last initialized
+        fresh (Iterable[int]): replicated variables committed since the last failure
+        chains (Iterable[Tuple[int, VersionChain]]): (variable, versions) in
+            ascending variable order
+    """
+    variables = array("q")
+    offsets = array("q", [0])
+    times = array("q")
+    values = array("q")
+    for variable, chain in chains:
+        variables.append(variable)
+        times.extend(chain.times)
+        values.extend(chain.values)
+        offsets.append(len(times))
+    fresh = array("q", sorted(fresh))
+    latest = max(
+        (times[offsets[i + 1] - 1] for i in range(len(variables))), default=0)
+    flags = (ACTIVE if active else 0) | (STALE if stale else 0)
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(
+            MAGIC, site_id, flags, len(variables), len(times), len(fresh), latest))
+        for column in (variables, offsets, times, values, fresh):
+            column.tofile(f)
+
+
+class SiteSnapshot:
+    """
+    Read-only view of a snapshot file. The file is memory-mapped and every column is
+    a memoryview into the mapping, so opening it costs the same however many
+    versions it holds, and versions are read without copying.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.mmap)
+        (magic, self.site_id, flags, count_variables, count_versions, count_fresh,
+         self.latest_time) = HEADER.unpack_from(self.view)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a site snapshot")
+        self.active = bool(flags & ACTIVE)
+        self.stale = bool(flags & STALE)
+
+        columns: List[memoryview] = []
+        start = HEADER.size
+        for length in (count_variables, count_variables + 1, count_versions,
+                       count_versions, count_fresh):
+            end = start + 8 * length
+            columns.append(self.view[start:end].cast("q"))
+            start = end
+        self.variables, self.offsets, self.times, self.values, self.fresh = columns
+
+    def __contains__(self, variable: int) -> bool:
+        return self.index_of(variable) >= 0
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.variables)
+
+    def __len__(self) -> int:
+        return len(self.variables)
+
+    def index_of(self, variable: int) -> int:
+        """
+        Returns:
+            int: position of the variable in the variables column, -1 if absent
+        """
+        index = bisect_left(self.variables, variable)
+        if index < len(self.variables) and self.variables[index] == variable:
+            return index
+        return -1
+
+    def versions(self, variable: int) -> Optional[VersionChain]:
+        """ Versions of a variable, as a VersionChain over slices of the mapping.
+        It supports the read methods only; copy it with `VersionChain.of` to modify.
+
+        Args:
+            variable (int)
+
+        Returns:
+            Optional[VersionChain]: None if the snapshot has no versions of it
+        """
+        index = self.index_of(variable)
+        if index < 0:
+            return None
+        start, end = self.offsets[index], self.offsets[index + 1]
+        return VersionChain.view(self.times[start:end], self.values[start:end])
+
+    def close(self) -> None:
+        """ Releases the mapping. Versions obtained from it and still referenced keep
+        it mapped: it is then unmapped once the last of them is collected. """
+        for name in ("variables", "offsets", "times", "values", "fresh"):
+            column = self.__dict__.pop(name, None)
+            if column is not None:
+                column.release()
+        self.view.release()
+        try:
+            self.mmap.close()
+        except BufferError:
+            pass  # views of versions still export it
+        self.mmap = None
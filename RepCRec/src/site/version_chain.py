@@ -0,0 +1,109 @@
+"""
+Authors:
+Saksham Bassi
+Aayush Agrawal
+"""
+from bisect import bisect_left, bisect_right
+from typing import List, Sequence
+
+
+class VersionChain:
+    """
+    Committed versions of a single variable on a site, kept as two parallel lists
+    sorted by timestamp. Commits almost always arrive in timestamp order, so a new
+    version is usually an O(1) append; lookups are a binary search.
+    """
+
+    def __init__(self, time: int, value: int):
+        self.times: List[int] = [time]
+        self.values: List[int] = [value]
+
+    @classmethod
+    def view(cls, times: Sequence[int], values: Sequence[int]) -> "VersionChain":
+        """ A chain reading the given sorted sequences in place, eg. memoryviews of a
+        snapshot. Only the read methods may be used on it.
+        """
+        chain = cls.__new__(cls)
+        chain.times = times
+        chain.values = values
+        return chain
+
+    @classmethod
+    def of(cls, chain: "VersionChain") -> "VersionChain":
+        """ A modifiable copy of a chain """
+        return cls.view(list(chain.times), list(chain.values))
+
+    def __contains__(self, time: int) -> bool:
+        index = bisect_left(self.times, time)
+        return index < len(self.times) and self.times[index] == time
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    def add(self, time: int, value: int) -> None:
+        """ Adds a committed version, overwriting any version at the same time.
+
+        Args:
+            time (int): timestamp of the version
+            value (int): committed value
+        """
+        if not self.times or time > self.times[-1]:
+            self.times.append(time)
+            self.values.append(value)
+            return
+        index = bisect_left(self.times, time)
+        if index < len(self.times) and self.times[index] == time:
+            self.values[index] = value
+            return
+        self.times.insert(index, time)
+        self.values.insert(index, value)
+
+    def floor_index(self, timestamp: int, inclusive: bool = False) -> int:
+        """
+        Index of the latest version strictly before `timestamp` (or at it, if
+        `inclusive`), -1 if there is none.
+        """
+        if inclusive:
+            return bisect_right(self.times, timestamp) - 1
+        return bisect_left(self.times, timestamp) - 1
+
+    def floor_time(self, timestamp: int, inclusive: bool = False) -> int:
+        """
+        Returns:
+            int: latest version time before `timestamp`, -1 if there is none
+        """
+        index = self.floor_index(timestamp, inclusive)
+        return self.times[index] if index >= 0 else -1
+
+    def floor_value(self, timestamp: int, inclusive: bool = False) -> int:
+        """
+        Returns:
+            int: value of the latest version before `timestamp`
+        """
+        index = self.floor_index(timestamp, inclusive)
+        if index < 0:
+            raise KeyError(timestamp)
+        return self.values[index]
+
+    def prune(self, watermark: int) -> int:
+        """ Drops versions that no read at or after `watermark` can observe, ie. every
+        version older than the floor of `watermark`.
+
+        Args:
+            watermark (int): oldest timestamp that may still be read
+
+        Returns:
+            int: number of versions removed
+        """
+        index = self.floor_index(watermark)
+        if index <= 0:
+            return 0
+        del self.times[:index]
+        del self.values[:index]
+        return index
+
+    def latest_time(self) -> int:
+        return self.times[-1]
+
+    def latest_value(self) -> int:
+        return self.values[-1]
@@ -1,2 +1,3 @@
 from src.transaction_manager.transaction import Transaction
+from src.transaction_manager.wait_queue import WaitQueue
 from src.transaction_manager.transaction_manager import TransactionManager
@@ -7,6 +7,11 @@ from src.enums import TransactionType, InstructionType
 
 
 class Transaction:
+    # One instance per parsed instruction; slots keep it free of a per-instance dict.
+    __slots__ = (
+        "id", "transaction_type", "instruction_type", "site_id", "variable", "value"
+    )
+
     def __init__(
         self,
         id_: int,
@@ -6,26 +6,69 @@ Aayush Agrawal
 from src.deadlock_manager import DeadlockManager
 from src.enums import TransactionType, InstructionType, AcquireLockPermission, LockType
 from src.io_manager import IOManager
+from src.placement import DefaultPlacement, PlacementPolicy
 from src.site import Site
-from src.transaction_manager import Transaction
-from src.utils import log
-from typing import Set, Tuple
+from src.transaction_manager import Transaction, WaitQueue
+from src.output import emit
+from typing import Iterable, List, Optional, Set, Tuple
+
+LOCK_TEMPLATE = (
+    "Transaction T{transaction} acquires {lock} lock on variable {variable} "
+    "at site {site} at time {time}"
+)
+# Instructions committing the pending commit group first: a failure must not abort
+# transactions that already ended, recoveries and dumps see their writes, and so do
+# read-only transactions, as their reads (also barriers) would without the window:
+# versions are committed at the time of their write, so a group committed after a
+# snapshot read could add versions older than the snapshot.
+COMMIT_BARRIERS = (
+    InstructionType.FAIL, InstructionType.RECOVER, InstructionType.DUMP,
+    InstructionType.BEGINRO,
+)
+
 
 class TransactionManager:
-    def __init__(self, total_sites: int):
+    def __init__(
+        self,
+        total_sites: int,
+        gc_interval: int = 0,
+        profiler=None,
+        num_variables: int = 20,
+        placement: Optional[PlacementPolicy] = None,
+        durability=None,
+        cluster=None,
+        commit_window: int = 0,
+    ):
         self.aborted_transactions = set()
+        self.available_replicas = {}  # {variable: [active Site holding it, by site id]}
+        self.cluster = cluster  # optional src.cluster.SiteCluster running the sites
+        self.commit_group = []  # ids of ended transactions waiting to be committed
+        self.commit_group_time = 0  # time the oldest of them ended
+        self.commit_window = commit_window  # ticks a commit may wait for others
+        self.placement = placement or DefaultPlacement(total_sites, num_variables)
         self.DeadlockManager = DeadlockManager()
+        self.durability = durability  # optional src.durability.Durability of sites
         self.IOManager = IOManager()
+        self.gc_interval = gc_interval  # ticks between version collections, 0 disables
+        self.gc_stats = {"runs": 0, "versions_reclaimed": 0}
+        self.profiler = profiler  # optional src.instrumentation.Profiler
+        # {id of active read-only transaction: {variable: (site, value, epoch, commits)}}
+        self.readonly_transactions = {}
         self.last_failed_timestamp = {}  # {site, time}
         self.sites = []  # object of sites
+        self.site_epoch = 0  # bumped whenever a site fails or recovers
         self.site_to_transactions = {}  # {site, Set(Transaction #)}
-        self.transactions = []  # store details about transactions
+        self.transactions = iter(())  # parsed transactions, consumed as they arrive
         self.transaction_start_timestamp = {}  # { transaction #, time }
+        self.transaction_to_sites = {}  # {transaction #: Set(site id)}
         self.timestamp = 0
         self.total_sites = total_sites
-        self.wait_for_lock_queue = []   # something list of transactions
-                                        # {transaction_id: set (variables)}
-        self.write_transactions_to_variables = {}
+        self.variable_commits = {}  # {variable: number of commits writing it}
+        self.wait_for_lock_queue = WaitQueue()  # operations waiting for locks
+        # uncommitted writes, {transaction_id: {variable: (value, time, replica Sites)}}
+        self.write_sets = {}
+        if profiler is not None:
+            profiler.attach(self)
 
     def abort_transaction(self, transaction_id: int):
         """
@@ -34,8 +77,9 @@ class TransactionManager:
         Args:
             transaction_id (int): id of transaction
         """
-        log(f"Abort transaction T{transaction_id}")
+        emit("abort", "Abort transaction T{transaction}", transaction=transaction_id)
         self.aborted_transactions.remove(transaction_id)
+        self.write_sets.pop(transaction_id, None)
 
     def add_transaction_to_site(self, site: Site, transaction: Transaction):
         """
@@ -48,23 +92,23 @@ class TransactionManager:
         existing_transactions = self.site_to_transactions.get(site.id, set())
         existing_transactions.add(transaction.id)
         self.site_to_transactions[site.id] = existing_transactions
+        self.transaction_to_sites.setdefault(transaction.id, set()).add(site.id)
 
     def add_variable_to_write_transaction(
-        self, transaction: Transaction, variable: int
+        self, transaction: Transaction, variable: int, replicas: List[Site]
     ):
         """
-        Helper function to map a variable to a transaction that has issued a write
-        request. 
+        Helper function to record a write in the write set of the transaction that
+        issued it. A later write of the same variable replaces the earlier one.
 
         Args:
             transaction (Transaction):
             variable (int):
+            replicas (List[Site]): sites the write is committed to, shared with the
+                replica cache rather than copied
         """
-        existing_variables = self.write_transactions_to_variables.get(
-            transaction.id, set()
-        )
-        existing_variables.add(variable)
-        self.write_transactions_to_variables[transaction.id] = existing_variables
+        write_set = self.write_sets.setdefault(transaction.id, dict())
+        write_set[variable] = (transaction.value, self.timestamp, replicas)
 
     def any_dependent_in_wait_queue(
         self, transaction: Transaction, locktype: LockType
@@ -82,82 +126,174 @@ class TransactionManager:
             with/ are dependents.
         """
         dependents = set()
-        for dep_transaction in self.wait_for_lock_queue:
-            if dep_transaction == transaction:
-                break
-
-            if transaction.variable == dep_transaction.variable:
-                if (
-                    locktype == LockType.READ
-                    and dep_transaction.transaction_type == TransactionType.WRITE
-                ):
-                    dependents.add(dep_transaction.id)
-                if (
-                    locktype == LockType.WRITE
-                    and dep_transaction.transaction_type != TransactionType.NONE
-                ):
-                    dependents.add(dep_transaction.id)
+        for dep_transaction in self.wait_for_lock_queue.ahead_of(transaction):
+            if (
+                locktype == LockType.READ
+                and dep_transaction.transaction_type == TransactionType.WRITE
+            ):
+                dependents.add(dep_transaction.id)
+            if (
+                locktype == LockType.WRITE
+                and dep_transaction.transaction_type != TransactionType.NONE
+            ):
+                dependents.add(dep_transaction.id)
         return dependents
 
-    def commit(self, transaction_id: int) -> None:
-        """ When a transaction is committed, all the variables that it changed (made a write
-        to), should be saved/committed on all the sites.
+    def collect_garbage(self) -> int:
+        """
+        Prunes, on every site, the committed versions that no snapshot can read any
+        more. The low watermark is the start time of the oldest active read-only
+        transaction; without one, only the latest version before now is needed.
+
+        Returns:
+            int: number of versions reclaimed
+        """
+        watermark = min(
+            (self.transaction_start_timestamp[transaction_id]
+             for transaction_id in self.readonly_transactions),
+            default=self.timestamp,
+        )
+        reclaimed = 0
+        for site in self.sites:
+            reclaimed += site.collect_garbage(watermark)
+        self.gc_stats["runs"] += 1
+        self.gc_stats["versions_reclaimed"] += reclaimed
+        return reclaimed
+
+    def commit(self, transaction_ids: List[int]) -> None:
+        """ When transactions are committed, all the variables that they changed (made
+        a write to), should be saved/committed on all the sites.
+
+        The write sets are regrouped by replica, in commit order, and applied site by
+        site, in one call per site written to. Only the transactions' own writes are
+        committed, on the replicas they were written to: a replica that was down at
+        the time of a write does not get it, and neither is any uncommitted write of
+        another transaction committed along with them.
+
+        Args:
+            transaction_ids (List[int]): ids of the transactions, in commit order
+        """
+        writes_per_site = dict()  # {Site: [(variable, value, time)]}
+        for transaction_id in transaction_ids:
+            write_set = self.write_sets.pop(transaction_id, dict())
+            for variable in sorted(write_set):
+                value, timestamp, replicas = write_set[variable]
+                for site in replicas:
+                    writes_per_site.setdefault(site, []).append(
+                        (variable, value, timestamp))
+                self.variable_commits[variable] = self.variable_commits.get(variable, 0) + 1
+        for site in sorted(writes_per_site, key=lambda site: site.id):
+            site.commit_writes(writes_per_site[site])
+        for transaction_id in transaction_ids:
+            emit("commit", "Transaction {transaction} is commited",
+                 transaction=transaction_id)
+
+    def flush_commits(self):
+        """
+        Commits the group of ended transactions in one pass (see `commit`), then
+        releases all their locks with one call per site, so waiters are woken once
+        for the whole group.
+        """
+        group = self.commit_group
+        if not group:
+            return
+        self.commit_group = []
+        self.commit(group)
+        self.end_transactions(group)
+        if self.cluster is not None:
+            self.cluster.flush()
+
+    def end_transactions(self, transaction_ids: List[int]):
+        """
+        Clears the metadata of committed or aborted transactions, including the
+        waits-for edges other transactions added to them while they waited in the
+        commit group, and releases their locks on the sites they accessed, in one
+        call per site.
+
+        Args:
+            transaction_ids (List[int])
+        """
+        site_ids = set()
+        for transaction_id in transaction_ids:
+            self.DeadlockManager.delete_edges_of_source(transaction_id=transaction_id)
+            del self.transaction_start_timestamp[transaction_id]
+            self.readonly_transactions.pop(transaction_id, None)
+            site_ids.update(self.transaction_to_sites.get(transaction_id, ()))
+            self.forget_transaction_sites(transaction_id)
+        for site_id in sorted(site_ids):
+            self.sites[site_id - 1].release_transactions_locks(transaction_ids)
+
+    def forget_transaction_sites(self, transaction_id: int):
+        """
+        Unmaps a transaction from the sites it accessed.
 
         Args:
             transaction_id (int)
         """
-        for variable in self.write_transactions_to_variables.get(transaction_id, set()):
-            for site in self.sites:
-                if site.is_active() and site.is_variable_present(variable):
-                    site.commit_cache(variable)
-        log(f"Transaction {transaction_id} is commited")
+        for site_id in self.transaction_to_sites.pop(transaction_id, ()):
+            if site_id in self.site_to_transactions:
+                self.site_to_transactions[site_id].discard(transaction_id)
 
-        # clear transaction metadata in memory
-        if transaction_id in self.write_transactions_to_variables:
-            self.write_transactions_to_variables.pop(transaction_id)
+    def call_sites(self, sites: List[Site], method: str, *args) -> Iterable:
+        """
+        Calls a Site method on each of the sites. Results are computed lazily, as
+        they are iterated; with a cluster, the calls are rather all made at once, in
+        parallel on the workers.
 
-        for site in self.sites:
-            if site.id in self.site_to_transactions:
-                if transaction_id in self.site_to_transactions[site.id]:
-                    self.site_to_transactions[site.id].remove(transaction_id)
+        Args:
+            sites (List[Site])
+            method (str): Site method
+            args: its arguments
+
+        Returns:
+            Iterable: result of the call on each site, in order
+        """
+        if self.cluster is not None:
+            return self.cluster.gather(sites, method, *args)
+        return (getattr(site, method)(*args) for site in sites)
 
     def check_wait_queue(self):
         """
-        Before a new transaction is picked up, we check if there is a transaction in the
-        wait queue that has the permission to acquire the desired locks on the variables
-        across sites.
+        Before a new transaction is picked up, we check if there are transactions in the
+        wait queue that have the permission to acquire the desired locks on the
+        variables across sites.
 
-        Therefore, this function iterates over all the transactions in the wait queue.
+        Only operations on variables that had a lock released, a commit, or a replica
+        recovered since the last check are retried (see `WaitQueue.wake`); anything
+        else would be refused again. They are visited once in FIFO order: running a
+        queued operation only takes locks and shortens the queue behind it, so
+        operations that could not run earlier in the pass cannot become runnable.
         Helper methods are then called to check the condition based on which type of
         lock the transaction desires.
 
         Returns:
-            bool: Whether a transaction in the wait queue is ready to be executed.
+            bool: Whether a transaction in the wait queue was executed.
         """
-        for index, transaction in enumerate(self.wait_for_lock_queue):
+        executed = False
+        for transaction in self.wait_for_lock_queue.pop_woken():
             if transaction.transaction_type == TransactionType.READONLY:
-                can_wait, site = self.check_readonly_transaction_from_wait_queue(transaction)
-                if not can_wait:
-                    self.wait_for_lock_queue.pop(index)
-                    self.log_read(
-                        transaction, site, self.transaction_start_timestamp[transaction.id])
-                    return True
-            
-            if transaction.transaction_type == TransactionType.READ:
+                snapshot_read = self.read_snapshot(transaction)
+                if snapshot_read is not None:
+                    self.wait_for_lock_queue.remove(transaction)
+                    self.emit_read(transaction, *snapshot_read)
+                    executed = True
+
+            elif transaction.transaction_type == TransactionType.READ:
                 can_wait, _, site = self.check_read_transaction_from_wait_queue(
                     transaction)
                 if not can_wait:
-                    self.wait_for_lock_queue.pop(index)
+                    self.wait_for_lock_queue.remove(transaction)
                     self.log_read(
                         transaction, site, self.timestamp)
-                    return True
+                    executed = True
 
-            if transaction.transaction_type == TransactionType.WRITE:
+            elif transaction.transaction_type == TransactionType.WRITE:
                 can_wait, _ = self.check_write_transaction_from_wait_queue(
                     transaction)
                 if not can_wait:
-                    self.wait_for_lock_queue.pop(index)
-                    return True
+                    self.wait_for_lock_queue.remove(transaction)
+                    executed = True
+        return executed
 
     def check_readonly_transaction_from_wait_queue(self, transaction) -> bool:
         """
@@ -179,9 +315,7 @@ class TransactionManager:
         """
         start_time = self.transaction_start_timestamp[transaction.id]
         variable = transaction.variable
-        for site in self.sites:
-            if not site.is_active() or not site.is_variable_present(variable):
-                continue
+        for site in self.replicas(variable):
             if not site.is_variable_unique(variable) and site.is_stale(variable):
                 continue
             if (
@@ -197,6 +331,38 @@ class TransactionManager:
             return False, site
         return True, None
 
+    def read_snapshot(self, transaction: Transaction) -> Optional[Tuple[Site, int]]:
+        """
+        Resolves a read of a read-only transaction to a site and the value committed
+        there as of the transaction's start, see
+        `check_readonly_transaction_from_wait_queue`.
+
+        Resolutions are cached per transaction. A cached one stays valid until a site
+        fails or recovers, which can change the eligible replicas, or a commit writes
+        the variable, which can add a version before the start time (versions are
+        stamped with their write time) or refresh a stale replica.
+
+        Args:
+            transaction (Transaction)
+
+        Returns:
+            Optional[Tuple[Site, int]]: the site and value read, None if the read has
+            to wait.
+        """
+        variable = transaction.variable
+        snapshot = self.readonly_transactions[transaction.id]
+        commits = self.variable_commits.get(variable, 0)
+        cached = snapshot.get(variable)
+        if cached is not None and cached[2] == self.site_epoch and cached[3] == commits:
+            return cached[0], cached[1]
+
+        can_wait, site = self.check_readonly_transaction_from_wait_queue(transaction)
+        if can_wait:
+            return None
+        value = site.get_value(variable, self.transaction_start_timestamp[transaction.id])
+        snapshot[variable] = (site, value, self.site_epoch, commits)
+        return site, value
+
     def check_read_transaction_from_wait_queue(self, transaction) -> Tuple[bool, Set[int]]:
         """
         We iterate over all the sites to find the one onto which the transaction can be
@@ -217,9 +383,7 @@ class TransactionManager:
         dependents = self.any_dependent_in_wait_queue(transaction, LockType.READ)
 
         variable = transaction.variable
-        for site in self.sites:
-            if not site.is_active() or not site.is_variable_present(variable):
-                continue
+        for site in self.replicas(variable):
             if not site.is_variable_unique(variable) and site.is_stale(variable):
                 continue
             if (
@@ -230,7 +394,8 @@ class TransactionManager:
                 continue
 
             dependents = set()
-            log(f"Transaction T{transaction.id} acquires READ lock on variable {variable} at site {site.id} at time {self.timestamp}")
+            emit("lock", LOCK_TEMPLATE, transaction=transaction.id, lock="READ",
+                 variable=variable, site=site.id, time=self.timestamp)
             site.acquire_lock(transaction.id, variable, LockType.READ)
             self.add_transaction_to_site(site, transaction)
             return False, dependents, site
@@ -255,11 +420,11 @@ class TransactionManager:
 
         dependents = self.any_dependent_in_wait_queue(transaction, LockType.WRITE)
 
-        for site in self.sites:
-            variable = transaction.variable
-            if not site.is_active() or not site.is_variable_present(variable):
-                continue
-            permit = site.can_acquire_write_lock(variable, transaction.id)
+        variable = transaction.variable
+        replicas = self.replicas(variable)
+        permits = self.call_sites(
+            replicas, "can_acquire_write_lock", variable, transaction.id)
+        for site, permit in zip(replicas, permits):
             if permit == AcquireLockPermission.NOT_ALLOWED:
                 dependents.update(site.get_all_transaction_locks(variable))
                 return True, dependents
@@ -270,20 +435,15 @@ class TransactionManager:
         if len(dependents) > 0:
             return True, dependents
 
-        can_wait = True
-
-        for site in self.sites:
-            variable = transaction.variable
-            if not site.is_active() or not site.is_variable_present(variable):
-                continue
-            
-            can_wait = False
-            log(f"Transaction T{transaction.id} acquires WRITE lock on variable {variable} at site {site.id} at time {self.timestamp}")
+        for site in replicas:
+            emit("lock", LOCK_TEMPLATE, transaction=transaction.id, lock="WRITE",
+                 variable=variable, site=site.id, time=self.timestamp)
             site.acquire_lock(transaction.id, variable, LockType.WRITE)
-            site.set_cache(variable, transaction.value, self.timestamp)
             self.add_transaction_to_site(site, transaction)
-            self.add_variable_to_write_transaction(transaction, variable)
-        return can_wait, dependents
+        if not replicas:
+            return True, dependents
+        self.add_variable_to_write_transaction(transaction, variable, replicas)
+        return False, dependents
 
     def detect_deadlock(self):
         """
@@ -299,13 +459,15 @@ class TransactionManager:
                 transactions=deadlocks
             )
             self.DeadlockManager.delete_edges_of_source(latest_transaction_id)
-            log(
-                f"Deadlock found: {len(deadlocks)} transactions in cycle")
+            emit("deadlock", "Deadlock found: {count} transactions in cycle",
+                 count=len(deadlocks), transactions=sorted(deadlocks))
             self.aborted_transactions.add(latest_transaction_id)
             for site_id in range(self.total_sites):
                 self.sites[site_id].release_all_transaction_locks(
                     latest_transaction_id)
-            log(f"Latest transaction T{latest_transaction_id} aborted to avoid deadlock.")
+            emit("deadlock_abort",
+                 "Latest transaction T{transaction} aborted to avoid deadlock.",
+                 transaction=latest_transaction_id)
             self.abort_transaction(latest_transaction_id)
             self.pop_waitq_transaction(latest_transaction_id)
             return True
@@ -330,6 +492,41 @@ class TransactionManager:
                 max_time = timestamp
         return latest_transaction_id
 
+    def replicas(self, variable: int) -> List[Site]:
+        """
+        Active sites holding the variable in site id order, computed from the placement
+        policy on first use and cached until a site fails or recovers.
+
+        Args:
+            variable (int)
+
+        Returns:
+            List[Site]
+        """
+        replicas = self.available_replicas.get(variable)
+        if replicas is None:
+            replicas = [
+                self.sites[site_id - 1] for site_id in self.placement.sites_of(variable)
+                if self.sites[site_id - 1].is_active()
+            ]
+            self.available_replicas[variable] = replicas
+        return replicas
+
+    def update_available_replicas(self, site: Site):
+        """
+        Drops the cached active replicas of the variables the site holds after it
+        failed or recovered, and invalidates the cached snapshot reads.
+
+        Args:
+            site (Site)
+        """
+        for variable in [
+                variable for variable in self.available_replicas
+                if self.placement.holds(site.id, variable)
+        ]:
+            del self.available_replicas[variable]
+        self.site_epoch += 1
+
     def handle_transaction_fail(self, transaction: Transaction):
         """
         Handles transaction when it fails.
@@ -342,6 +539,7 @@ class TransactionManager:
         """
         self.sites[transaction.site_id - 1].release_all_locks()
         self.sites[transaction.site_id - 1].shutdown()
+        self.update_available_replicas(self.sites[transaction.site_id - 1])
         if transaction.site_id in self.site_to_transactions:
             site_transactions = self.site_to_transactions[transaction.site_id]
             for site_transaction in site_transactions:
@@ -349,7 +547,8 @@ class TransactionManager:
             del self.site_to_transactions[transaction.site_id]
         self.last_failed_timestamp[self.sites[transaction.site_id - 1]
                                    ] = self.timestamp
-        log(f"Site {transaction.site_id} failed at time {self.timestamp}")
+        emit("fail", "Site {site} failed at time {time}",
+             site=transaction.site_id, time=self.timestamp)
 
     def handle_transaction_recover(self, transaction: Transaction):
         """ Handles transaction when it is RECOVER
@@ -358,7 +557,9 @@ class TransactionManager:
             transaction (Transaction)
         """
         self.sites[transaction.site_id - 1].activate()
-        log(f"Site {transaction.site_id} recovered at time {self.timestamp}")
+        self.update_available_replicas(self.sites[transaction.site_id - 1])
+        emit("recover", "Site {site} recovered at time {time}",
+             site=transaction.site_id, time=self.timestamp)
 
     def handle_transaction_dump(self, transaction: Transaction):
         """ Handles transaction when it is DUMP
@@ -367,7 +568,7 @@ class TransactionManager:
             transaction (Transaction)
         """
         for site in self.sites:
-            log(f"DUMP data for site {site.id}")
+            emit("dump_site", "DUMP data for site {site}", site=site.id)
             site.dump(self.timestamp)
 
     def handle_transaction_begin(self, transaction: Transaction):
@@ -376,7 +577,8 @@ class TransactionManager:
         Args:
             transaction (Transaction)
         """
-        log(f"Transaction T{transaction.id} BEGIN at time {self.timestamp}")
+        emit("begin", "Transaction T{transaction} BEGIN at time {time}",
+             transaction=transaction.id, time=self.timestamp)
         self.transaction_start_timestamp[transaction.id] = self.timestamp
 
     def handle_transaction_begin_readonly(self, transaction: Transaction):
@@ -385,30 +587,38 @@ class TransactionManager:
         Args:
             transaction (Transaction)
         """
-        log(f"Transaction T{transaction.id} BEGINRO at time {self.timestamp}")
+        emit("begin_readonly", "Transaction T{transaction} BEGINRO at time {time}",
+             transaction=transaction.id, time=self.timestamp)
         self.transaction_start_timestamp[transaction.id] = self.timestamp
+        self.readonly_transactions[transaction.id] = dict()
 
     def handle_transaction_end(self, transaction: Transaction):
         """ Handles transaction when it is END
 
-        - Attempt to commit the transaction, if failed, abort it.
         - If transaction is present in the wait queue, remove it.
-        - Release all the locks that the transaction held.
         - Remove the edges that had source has given transactions.
+        - If the transaction cannot commit, abort it and release all the locks that it
+          held.
+        - Otherwise it joins the commit group, which is committed right away without a
+          commit window (see `flush_commits`), or else once its oldest transaction
+          waited `commit_window` ticks. It can no longer wait for locks, so it can no
+          longer be part of a deadlock meanwhile.
 
         Args:
             transaction (Transaction)
         """
-        if self.is_commit_allowed(transaction_id=transaction.id):
-            self.commit(transaction_id=transaction.id)
-        else:
-            self.abort_transaction(transaction_id=transaction.id)
-        del self.transaction_start_timestamp[transaction.id]
         self.pop_waitq_transaction(transaction.id)
-        for site_id in range(self.total_sites):
-            self.sites[site_id].release_all_transaction_locks(transaction.id)
         self.DeadlockManager.delete_edges_of_source(
             transaction_id=transaction.id)
+        if not self.is_commit_allowed(transaction_id=transaction.id):
+            self.abort_transaction(transaction_id=transaction.id)
+            self.end_transactions([transaction.id])
+            return
+        if not self.commit_group:
+            self.commit_group_time = self.timestamp
+        self.commit_group.append(transaction.id)
+        if self.commit_window <= 0:
+            self.flush_commits()
 
     def handle_transaction_none(self, transaction: Transaction):
         """
@@ -427,17 +637,16 @@ class TransactionManager:
         """
         
         if transaction.transaction_type == TransactionType.READONLY:
-            can_wait, site = self.check_readonly_transaction_from_wait_queue(
-                transaction)
-            if can_wait:
+            snapshot_read = self.read_snapshot(transaction)
+            if snapshot_read is None:
                 self.wait_for_lock_queue.append(transaction)
-                log(
-                    """Transaction T{0} wants to READONLY variable {1} at time {2}: pushed to wait queue""".format(
-                        transaction.id, transaction.variable, self.timestamp)
-                )
+                emit("wait",
+                     "Transaction T{transaction} wants to READONLY variable {variable} "
+                     "at time {time}: pushed to wait queue",
+                     transaction=transaction.id, operation="READONLY",
+                     variable=transaction.variable, time=self.timestamp)
             else:
-                self.log_read(transaction, site,
-                              self.transaction_start_timestamp[transaction.id])
+                self.emit_read(transaction, *snapshot_read)
 
         elif transaction.transaction_type == TransactionType.READ:
             can_wait, dependents, site = self.check_read_transaction_from_wait_queue(
@@ -446,10 +655,11 @@ class TransactionManager:
                 self.DeadlockManager.insert_transactions_to_source(
                     transaction.id, dependents)
                 self.wait_for_lock_queue.append(transaction)
-                log(
-                    """Transaction T{0} wants to READ variable x{1} at time {2}: pushed to wait queue""".format(
-                        transaction.id, transaction.variable, self.timestamp)
-                )
+                emit("wait",
+                     "Transaction T{transaction} wants to READ variable x{variable} "
+                     "at time {time}: pushed to wait queue",
+                     transaction=transaction.id, operation="READ",
+                     variable=transaction.variable, time=self.timestamp)
             else:
                 self.log_read(transaction, site, self.timestamp)
 
@@ -458,10 +668,12 @@ class TransactionManager:
             if can_wait:
                 self.DeadlockManager.insert_transactions_to_source(transaction.id, dependents)
                 self.wait_for_lock_queue.append(transaction)
-                log(
-                    """Transaction T{0} wants to WRITE value {1} for variable {2} at time {3}: pushed to wait queue""".format(
-                        transaction.id, transaction.value, transaction.variable, self.timestamp)
-                )
+                emit("wait",
+                     "Transaction T{transaction} wants to WRITE value {value} for "
+                     "variable {variable} at time {time}: pushed to wait queue",
+                     transaction=transaction.id, operation="WRITE",
+                     value=transaction.value, variable=transaction.variable,
+                     time=self.timestamp)
 
     def is_commit_allowed(self, transaction_id: int):
         """
@@ -477,11 +689,11 @@ class TransactionManager:
         return transaction_id not in self.aborted_transactions
 
     def log_read(self, transaction: Transaction, site: Site, timestamp: int):
-        variable = transaction.variable
-        begin_time = self.transaction_start_timestamp[transaction.id]
-        value = site.get_value(variable, timestamp)
-        log(
-            f"Variable {variable}: {value}")
+        self.emit_read(transaction, site, site.get_value(transaction.variable, timestamp))
+
+    def emit_read(self, transaction: Transaction, site: Site, value: int):
+        emit("read", "Variable {variable}: {value}", transaction=transaction.id,
+             variable=transaction.variable, value=value, site=site.id)
 
     def pop_waitq_transaction(self, pop_transaction_id: int):
         """
@@ -490,45 +702,106 @@ class TransactionManager:
         Args:
             transaction_id (int): transaction id
         """
-        for index, transaction in enumerate(self.wait_for_lock_queue):
-            if transaction.id == pop_transaction_id:
-                self.wait_for_lock_queue.pop(index)
+        self.wait_for_lock_queue.remove_transaction(pop_transaction_id)
 
     def prepare_input(self, filename: str):
-        """ creates sites and pushes it to self.sites
+        """ creates sites and pushes it to self.sites, then executes the input as it
+        is parsed
 
         Args:
-            filename (str): file containing input
+            filename (str): file containing input, "-" for stdin
 
         Returns:
             None
         """
-        for id_ in range(self.total_sites):
-            self.sites.append(Site(id_=id_ + 1))
-            self.sites[id_].initialize()
-
+        self.prepare_sites()
         self.transactions = self.IOManager.input_file(filename)
         self.start_execution()
 
+    def prepare_sites(self):
+        """ creates and initializes the sites
+
+        With durability, each site is restored from its write-ahead log and the clock
+        resumes after the latest version restored. With a cluster, the sites run in
+        its worker processes.
+
+        Returns:
+            None
+        """
+        if self.cluster is not None:
+            self.sites, latest = self.cluster.start(
+                self.placement, self.wait_for_lock_queue.wake, self.durability)
+            self.timestamp = max(self.timestamp, latest)
+            if self.profiler is not None:
+                for site in self.sites:
+                    self.profiler.attach_site(site)
+            return
+        for id_ in range(self.total_sites):
+            self.sites.append(Site(
+                id_=id_ + 1,
+                placement=self.placement,
+                listener=self.wait_for_lock_queue.wake,
+            ))
+            self.sites[id_].initialize()
+            if self.durability is not None:
+                self.timestamp = max(
+                    self.timestamp, self.durability.attach_site(self.sites[id_]))
+            if self.profiler is not None:
+                self.profiler.attach_site(self.sites[id_])
+
     def start_execution(self):
         """
-        Starts the execution on all transactions
+        Starts the execution on all transactions, pulling each one from the parser
+        only when the previous one has been handled
         """
         for transaction in self.transactions:
-            self.timestamp += 1
-            while True:
-                if not self.detect_deadlock():
-                    break
-            while True:
-                if not self.check_wait_queue():
-                    break
-            transaction_handler = {
-                InstructionType.FAIL: self.handle_transaction_fail,
-                InstructionType.RECOVER: self.handle_transaction_recover,
-                InstructionType.DUMP: self.handle_transaction_dump,
-                InstructionType.BEGINRO: self.handle_transaction_begin_readonly,
-                InstructionType.BEGIN: self.handle_transaction_begin,
-                InstructionType.END: self.handle_transaction_end,
-                InstructionType.NO: self.handle_transaction_none,
-            }
-            transaction_handler[transaction.instruction_type](transaction)
+            self.execute(transaction)
+        self.finish()
+
+    def execute(self, transaction: Transaction):
+        """
+        Executes a single instruction as one tick: the clock advances, a commit group
+        that waited long enough is committed, deadlocks are resolved and waiting
+        operations retried before the instruction is handled.
+
+        Args:
+            transaction (Transaction): parsed instruction
+        """
+        self.timestamp += 1
+        if self.commit_group and (
+                transaction.instruction_type in COMMIT_BARRIERS
+                or transaction.transaction_type == TransactionType.READONLY
+                or self.timestamp - self.commit_group_time >= self.commit_window
+        ):
+            self.flush_commits()
+        if self.gc_interval and self.timestamp % self.gc_interval == 0:
+            self.collect_garbage()
+        while True:
+            if not self.detect_deadlock():
+                break
+        self.check_wait_queue()
+        transaction_handler = {
+            InstructionType.FAIL: self.handle_transaction_fail,
+            InstructionType.RECOVER: self.handle_transaction_recover,
+            InstructionType.DUMP: self.handle_transaction_dump,
+            InstructionType.BEGINRO: self.handle_transaction_begin_readonly,
+            InstructionType.BEGIN: self.handle_transaction_begin,
+            InstructionType.END: self.handle_transaction_end,
+            InstructionType.NO: self.handle_transaction_none,
+        }
+        transaction_handler[transaction.instruction_type](transaction)
+        if self.cluster is not None:
+            self.cluster.flush()
+
+    def finish(self):
+        """
+        Ends an execution: commits the pending commit group, flushes the site logs,
+        reports the profile, if any, and stops the cluster workers.
+        """
+        self.flush_commits()
+        for site in self.sites:
+            site.close()
+        if self.profiler is not None:
+            self.profiler.report()
+        if self.cluster is not None:
+            self.cluster.stop()
@@ -0,0 +1,128 @@
+"""
+Authors:
+Saksham Bassi
+Aayush Agrawal
+"""
+from typing import Container, Dict, Iterator, List, Sized
+
+from src.transaction_manager import Transaction
+
+
+class WaitQueue:
+    """
+    Operations waiting for a lock, kept in one global FIFO order and additionally in a
+    FIFO per variable, so contention checks only look at operations on the same
+    variable. Dicts keyed by an increasing sequence number serve as ordered sets.
+
+    Sites and lock managers publish the variables that may have become available
+    through `wake`; only the operations on those variables are handed out again by
+    `pop_woken`, so ticks where nothing was released cost nothing.
+    """
+
+    def __init__(self):
+        self.next_sequence = 0
+        self.queue: Dict[int, Transaction] = dict()  # {sequence: Transaction}
+        self.sequences: Dict[Transaction, int] = dict()  # {Transaction: sequence}
+        self.variable_queues = dict()  # {variable: {sequence: Transaction}}
+        self.transaction_queues = dict()  # {transaction_id: {sequence: Transaction}}
+        self.woken_variables = set()
+
+    def __contains__(self, transaction: Transaction) -> bool:
+        return transaction in self.sequences
+
+    def __iter__(self) -> Iterator[Transaction]:
+        return iter(list(self.queue.values()))
+
+    def __len__(self) -> int:
+        return len(self.queue)
+
+    def append(self, transaction: Transaction) -> None:
+        """ Pushes an operation at the back of the queue
+
+        Args:
+            transaction (Transaction)
+        """
+        sequence = self.next_sequence
+        self.next_sequence += 1
+        self.queue[sequence] = transaction
+        self.sequences[transaction] = sequence
+        self.variable_queues.setdefault(transaction.variable, dict())[sequence] = transaction
+        self.transaction_queues.setdefault(transaction.id, dict())[sequence] = transaction
+
+    def remove(self, transaction: Transaction) -> None:
+        """ Removes a queued operation
+
+        Args:
+            transaction (Transaction)
+        """
+        sequence = self.sequences.pop(transaction)
+        del self.queue[sequence]
+        for index, key in (
+                (self.variable_queues, transaction.variable),
+                (self.transaction_queues, transaction.id),
+        ):
+            entries = index[key]
+            del entries[sequence]
+            if not entries:
+                del index[key]
+
+    def remove_transaction(self, transaction_id: int) -> List[Transaction]:
+        """ Removes every queued operation issued by the given transaction
+
+        Args:
+            transaction_id (int)
+
+        Returns:
+            List[Transaction]: the removed operations
+        """
+        removed = list(self.transaction_queues.get(transaction_id, dict()).values())
+        for transaction in removed:
+            self.remove(transaction)
+        # operations queued behind the removed ones lose those dependencies
+        self.wake({transaction.variable for transaction in removed})
+        return removed
+
+    def ahead_of(self, transaction: Transaction) -> Iterator[Transaction]:
+        """ Operations on the same variable queued before the given one; all of them
+        if the given operation is not queued.
+
+        Args:
+            transaction (Transaction)
+        """
+        sequence = self.sequences.get(transaction)
+        for queued_sequence, queued in self.variable_queues.get(
+                transaction.variable, dict()).items():
+            if queued_sequence == sequence:
+                break
+            yield queued
+
+    def wake(self, variables: Container[int]) -> None:
+        """ Marks the waiters on the given variables to be retried
+
+        Args:
+            variables (Container[int]): variables whose locks or replicas changed; a
+                container without a size is only probed with the waited variables
+        """
+        if (
+                isinstance(variables, Sized)
+                and len(variables) <= len(self.variable_queues)
+        ):
+            self.woken_variables.update(
+                variable for variable in variables if variable in self.variable_queues)
+        else:
+            self.woken_variables.update(
+                variable for variable in self.variable_queues if variable in variables)
+
+    def pop_woken(self) -> List[Transaction]:
+        """
+        Returns:
+            List[Transaction]: the queued operations on woken variables in FIFO order;
+            the woken set is cleared.
+        """
+        if not self.woken_variables:
+            return []
+        woken = dict()
+        for variable in self.woken_variables:
+            woken.update(self.variable_queues.get(variable, dict()))
+        self.woken_variables = set()
+        return [woken[sequence] for sequence in sorted(woken)]
@@ -4,25 +4,37 @@ Saksham Bassi
 Aayush Agrawal
 """
 import os
+from functools import lru_cache
 
 from read_config import read_config
+from src.output import get_output
 
 path = os.path.dirname(os.path.realpath(__file__))
 configdir = "/".join([path, "..", "config.ini"])
-config = read_config(configdir)
+
+
+@lru_cache(maxsize=None)
+def get_config():
+    """ reads the default configuration file on first use
+
+    Returns:
+        config: object of ConfigParser with config values
+    """
+    return read_config(configdir)
 
 
 def log(message, end=None):
-    """ prints on output screen
+    """ writes raw text to the current output sink
 
     Args:
         message (): message to be printed
-        end (str): end for print
+        end (str): end for print, a newline by default
 
     Returns:
         None
     """
     if end is None:
-        print(message)
-    else:
-        print(message, end=end)
+        end = "\n"
+    output = get_output()
+    if output.enabled:
+        output.write(f"{message}{end}")
@@ -0,0 +1 @@
+from src.workload.workload import WorkloadGenerator
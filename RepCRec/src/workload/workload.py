@@ -0,0 +1,108 @@
+"""
+Authors:
+Saksham Bassi
+Aayush Agrawal
+"""
+import random
+from itertools import accumulate
+from typing import Iterator
+
+
+class WorkloadGenerator:
+    """
+    Generates synthetic input scripts in the same grammar as tests/inputs.
+
+    Transactions are started until `concurrency` of them are active, each issuing
+    `operations` reads/writes in random interleaving with the others before it ends.
+    Variables are drawn with a Zipf-like skew (0 is uniform, larger values make low
+    numbered variables hotter). Sites fail at random and recover `downtime`
+    instructions later; at least one site always stays up.
+    """
+
+    def __init__(
+            self,
+            sites: int = 10,
+            variables: int = 20,
+            transactions: int = 100,
+            concurrency: int = 5,
+            operations: int = 5,
+            read_ratio: float = 0.5,
+            skew: float = 0.0,
+            failure_rate: float = 0.0,
+            downtime: int = 10,
+            readonly_share: float = 0.0,
+            dump_rate: float = 0.0,
+            seed: int = 0,
+    ):
+        self.sites = sites
+        self.variables = variables
+        self.transactions = transactions
+        self.concurrency = concurrency
+        self.operations = operations
+        self.read_ratio = read_ratio
+        self.skew = skew
+        self.failure_rate = failure_rate
+        self.downtime = downtime
+        self.readonly_share = readonly_share
+        self.dump_rate = dump_rate
+        self.seed = seed
+
+    def generate(self) -> Iterator[str]:
+        """ Generates the instruction lines of a script
+
+        Yields:
+            line (str): one instruction, without a newline
+        """
+        rng = random.Random(self.seed)
+        weights = list(accumulate(
+            1 / (rank ** self.skew) for rank in range(1, self.variables + 1)
+        ))
+        population = range(1, self.variables + 1)
+
+        active = dict()  # {transaction_id: [readonly, operations left]}
+        failed = dict()  # {site_id: instruction count at which it recovers}
+        started = 0
+        issued = 0
+
+        while started < self.transactions or active:
+            issued += 1
+            for site_id, recover_at in list(failed.items()):
+                if issued >= recover_at:
+                    del failed[site_id]
+                    yield f"recover({site_id})"
+
+            if (
+                    self.failure_rate
+                    and len(failed) < self.sites - 1
+                    and rng.random() < self.failure_rate
+            ):
+                site_id = rng.choice(
+                    [i for i in range(1, self.sites + 1) if i not in failed])
+                failed[site_id] = issued + self.downtime
+                yield f"fail({site_id})"
+                continue
+
+            if self.dump_rate and rng.random() < self.dump_rate:
+                yield "dump()"
+                continue
+
+            if started < self.transactions and len(active) < self.concurrency:
+                started += 1
+                readonly = rng.random() < self.readonly_share
+                active[started] = [readonly, self.operations]
+                yield f"beginRO(T{started})" if readonly else f"begin(T{started})"
+                continue
+
+            transaction_id = rng.choice(list(active))
+            readonly, remaining = active[transaction_id]
+            if remaining == 0:
+                del active[transaction_id]
+                yield f"end(T{transaction_id})"
+                continue
+            active[transaction_id][1] -= 1
+
+            variable = rng.choices(population, cum_weights=weights)[0]
+            if readonly or rng.random() < self.read_ratio:
+                yield f"R(T{transaction_id},x{variable})"
+            else:
+                yield f"W(T{transaction_id},x{variable},{rng.randint(1, 10 ** 4)})"
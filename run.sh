@@ -1,6 +1,6 @@
-if [ $# -eq 2 ]
+if [ $# -ge 2 ]
   then
-    python RepCRec/main.py --run-all --input $2
+    python RepCRec/main.py --run-all --input $2 --jobs ${3:-1}
 else
     python RepCRec/main.py --input $1
 fi
\ No newline at end of file